@@ -0,0 +1,164 @@
+"""
+MindMate performance benchmarks
+
+Usage:
+    python benchmarks.py login [--users 200] [--threads 1,2,4,8] [--seconds 3]
+    python benchmarks.py register [--users 2000] [--existing 20000]
+    python benchmarks.py mood [--years 5] [--per-day 3] [--repeat 500]
+
+Each benchmark runs against a throw-away database in a temporary directory,
+so it never touches users.db or user_data/ in the working tree.
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+import threading
+
+# Keep import side effects (log file, users.db, Ollama bootstrap) out of the repo
+os.environ.setdefault("OLLAMA_MANAGE_SERVER", "False")
+os.environ.setdefault("OLLAMA_READY_TIMEOUT", "0")
+os.environ.setdefault("SESSION_SECRET", "benchmark-only-secret")
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+WORK_DIR = tempfile.mkdtemp(prefix="mindmate_bench_")
+os.chdir(WORK_DIR)
+
+import logging
+import notebook4
+
+# Per-request INFO logging would dominate the timings
+logging.getLogger("MindMateAPI").setLevel(logging.WARNING)
+
+
+def _run_threads(n_threads: int, seconds: float, operation) -> int:
+    """Call operation(thread_index, i) in a loop on n_threads for `seconds`; return total calls"""
+    counts = [0] * n_threads
+    stop_at = time.perf_counter() + seconds
+
+    def worker(index):
+        i = 0
+        while time.perf_counter() < stop_at:
+            operation(index, i)
+            i += 1
+        counts[index] = i
+
+    threads = [threading.Thread(target=worker, args=(t,)) for t in range(n_threads)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return sum(counts)
+
+
+def bench_login(args):
+    """Login throughput as the number of request threads grows"""
+    manager = notebook4.UserManager(db_path=os.path.join(WORK_DIR, "bench_users.db"))
+    # Measure the concurrent read path, not scrypt: hashes stored with n=2
+    # verify at that cost (and unknown users would too, via verify_dummy)
+    manager.password_hasher.n = 2
+    for i in range(args.users):
+        manager.create_user(f"bench_user_{i}", "bench-password", f"bench_{i}@example.com")
+
+    def login(thread_index, i):
+        username = f"bench_user_{(thread_index * 7919 + i) % args.users}"
+        assert manager.authenticate_user(username, "bench-password")
+
+    print(f"Login throughput ({args.users} users, {args.seconds:.0f}s per run)")
+    baseline = None
+    for n_threads in [int(t) for t in args.threads.split(",")]:
+        total = _run_threads(n_threads, args.seconds, login)
+        rate = total / args.seconds
+        baseline = baseline or rate
+        print(f"  {n_threads:>3} threads: {rate:>9.0f} logins/s  (x{rate / baseline:.2f})")
+
+
+def bench_register(args):
+    """Bulk registration with and without the username/email Bloom filter"""
+    print(f"Bulk registration ({args.users} new users, {args.existing} existing)")
+    for use_filter in (False, True):
+        db_path = os.path.join(WORK_DIR, f"bench_register_{int(use_filter)}.db")
+        manager = notebook4.UserManager(db_path=db_path)
+        # Seed directly so the KDF doesn't dominate setup
+        rows = [(f"seed_{i}", f"seed_user_{i}", "x", f"seed_{i}@example.com") for i in range(args.existing)]
+        manager.db_writer.execute(lambda conn: (
+            conn.executemany("INSERT INTO users (id, username, password_hash, email) VALUES (?, ?, ?, ?)", rows),
+            conn.commit()
+        ))
+        manager._warm_caches()
+        manager.user_filter_ready = use_filter
+        # Registration cost here is about the availability checks, not scrypt
+        manager.password_hasher.n = 2
+
+        # Read statements issued by this (request) thread
+        statements = [0]
+        manager.db_pool.acquire().set_trace_callback(lambda sql: statements.__setitem__(0, statements[0] + 1))
+
+        start = time.perf_counter()
+        for i in range(args.users):
+            username, email = f"new_user_{i}", f"new_{i}@example.com"
+            if not manager.check_user_exists(username, email):
+                manager.create_user(username, "bench-password", email)
+        elapsed = time.perf_counter() - start
+        label = "bloom filter" if use_filter else "no filter   "
+        print(f"  {label}: {args.users / elapsed:>8.0f} registrations/s, "
+              f"{statements[0]:>6} read queries, {manager.availability_metrics}")
+
+
+def bench_mood(args):
+    """Multi-window mood analytics vs. the per-window get_mood_trends calls it replaces"""
+    windows = (7, 30, 90)
+    profile = notebook4.UserProfile("bench_mood_user")
+    emotions = ["happy", "sad", "calm", "anxious", "tired", "hopeful", "angry", "lonely"]
+    total = int(args.years * 365 * args.per_day)
+    step = 86400.0 / args.per_day
+    now = time.time()
+    rng = random.Random(42)
+    for i in range(total):
+        profile.mood_history.append(now - (total - i) * step, rng.randint(1, 10), rng.sample(emotions, 2))
+
+    def timed(label, fn, repeat):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            fn()
+        per_call = (time.perf_counter() - start) / repeat
+        print(f"  {label:<44}: {per_call * 1e6:>10.1f} us")
+        return per_call
+
+    print(f"Mood analytics ({total} entries, windows {windows})")
+    trends = timed(f"get_mood_trends, averages only ({len(windows)} calls)",
+                   lambda: [profile.get_mood_trends(days) for days in windows], args.repeat)
+    analytics = timed("get_mood_analytics (1 call)",
+                      lambda: profile.get_mood_analytics(windows), args.repeat)
+    print(f"  analytics cost vs. the trends calls: x{analytics / trends:.2f} "
+          f"(adds slope, volatility and emotion frequencies)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+
+    login = subparsers.add_parser("login", help="login throughput vs. worker threads")
+    login.add_argument("--users", type=int, default=200)
+    login.add_argument("--threads", default="1,2,4,8")
+    login.add_argument("--seconds", type=float, default=3.0)
+    login.set_defaults(func=bench_login)
+
+    register = subparsers.add_parser("register", help="bulk registration DB traffic with the user filter")
+    register.add_argument("--users", type=int, default=2000)
+    register.add_argument("--existing", type=int, default=20000)
+    register.set_defaults(func=bench_register)
+
+    mood = subparsers.add_parser("mood", help="multi-window mood analytics on a long history")
+    mood.add_argument("--years", type=float, default=5.0)
+    mood.add_argument("--per-day", type=float, default=3.0)
+    mood.add_argument("--repeat", type=int, default=500)
+    mood.set_defaults(func=bench_mood)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""
+Gunicorn configuration for MindMate
+
+All settings can be overridden through environment variables:
+    GUNICORN_WORKERS, GUNICORN_THREADS, GUNICORN_TIMEOUT,
+    GUNICORN_GRACEFUL_TIMEOUT, SERVER_PORT
+"""
+import gc
+import os
+import signal
+
+bind = f"0.0.0.0:{os.getenv('SERVER_PORT', '5000')}"
+
+# Each worker shares the preloaded models, so memory grows slowly with workers
+workers = int(os.getenv("GUNICORN_WORKERS", "2"))
+threads = int(os.getenv("GUNICORN_THREADS", "4"))
+worker_class = "gthread"
+
+# Load AppGlobals services (SentenceTransformer, classifiers, Whisper) in the
+# master before forking so workers share the weights copy-on-write
+preload_app = True
+
+# Chat responses are streamed and can take a while
+timeout = int(os.getenv("GUNICORN_TIMEOUT", "120"))
+# Time given to in-flight /api/chat streams to finish on shutdown
+graceful_timeout = int(os.getenv("GUNICORN_GRACEFUL_TIMEOUT", "60"))
+keepalive = 5
+
+
+def when_ready(server):
+    """Move everything allocated during preload out of the GC's reach so
+    collections in the workers don't touch (and copy) the shared pages"""
+    gc.collect()
+    gc.freeze()
+
+
+def post_fork(server, worker):
+    """Background threads don't survive fork: restart Ollama readiness polling
+    (the master already started the server itself) and the database
+    maintenance schedulers in the worker"""
+    from notebook4 import ollama_bootstrap, start_background_tasks
+    ollama_bootstrap.start(manage_server=False)
+    start_background_tasks()
+
+
+def post_worker_init(worker):
+    """Stop accepting new chat streams as soon as the worker receives SIGTERM"""
+    from notebook4 import chat_stream_tracker
+    gunicorn_handle_exit = worker.handle_exit
+
+    def handle_exit(sig, frame):
+        chat_stream_tracker.start_draining()
+        gunicorn_handle_exit(sig, frame)
+
+    signal.signal(signal.SIGTERM, handle_exit)
+    signal.siginterrupt(signal.SIGTERM, False)
+
+
+def worker_exit(server, worker):
+    from notebook4 import shutdown_app
+    shutdown_app(drain_timeout=graceful_timeout)
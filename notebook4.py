@@ -47,14 +47,18 @@ else:
 # ========================
 # IMPORTS
 # ========================
+import time
+_import_started_at = time.perf_counter()
+
 import os
 import sys
 import json
-import time
 import uuid
+import math
 import random
 import logging
 import threading
+import importlib
 import tempfile
 import subprocess
 import numpy as np
@@ -64,31 +68,123 @@ from datetime import datetime, timedelta
 from typing import Dict, List, Tuple, Any, Optional
 from flask import Flask, request, jsonify, send_file, Response, stream_with_context, make_response
 from flask_cors import CORS
-from cryptography.fernet import Fernet
+from cryptography.fernet import Fernet, MultiFernet, InvalidToken
 # New imports for user management
 import sqlite3
 import hashlib
+import hmac
+import base64
 import secrets
+import queue
+import contextvars
+from contextlib import contextmanager
+import copy
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process profile locking
+    fcntl = None
+import bisect
+from array import array
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor, ProcessPoolExecutor, TimeoutError as FutureTimeoutError
 from functools import wraps
 
-# Try to import optional packages
-try:
-    import whisper
-    import ollama
-    import faiss
-    from sentence_transformers import SentenceTransformer
-except ImportError as e:
-    print(f"⚠️ Optional NLP packages not available: {e}")
+CORE_IMPORT_SECONDS = time.perf_counter() - _import_started_at
 
-# Try to import transformer pipeline
-try:
-    from transformers import pipeline
-    print("✅ NLP transformers pipeline loaded successfully")
-except ImportError as e:
-    print(f"⚠️ Transformers pipeline not available: {e}")
-    # Define a fallback pipeline function
-    def pipeline(*args, **kwargs):
-        raise ImportError("Transformers pipeline is not available")
+# ========================
+# LAZY IMPORTS
+# ========================
+class LazyModule:
+    """Module proxy that defers the real import until an attribute is first accessed.
+
+    Heavy ML packages (torch, transformers, whisper...) take tens of seconds to
+    import, so API-only workers (auth, mood tracking) should never pay for them.
+    """
+    registry = {}
+
+    def __init__(self, module_name: str):
+        self.module_name = module_name
+        self._module = None
+        self._import_error = None
+        self.import_seconds = None
+        self._lock = threading.Lock()
+        LazyModule.registry[module_name] = self
+
+    def _load(self):
+        """Import the wrapped module once; later failures re-raise the cached error"""
+        if self._module is not None:
+            return self._module
+        with self._lock:
+            if self._module is None:
+                if self._import_error is not None:
+                    raise self._import_error
+                start = time.perf_counter()
+                try:
+                    self._module = importlib.import_module(self.module_name)
+                except ImportError as e:
+                    self._import_error = e
+                    logging.getLogger("MindMateAPI").warning(
+                        f"⚠️ Optional package not available: {self.module_name} ({e})"
+                    )
+                    raise
+                finally:
+                    self.import_seconds = time.perf_counter() - start
+                logging.getLogger("MindMateAPI").info(
+                    f"📦 Imported {self.module_name} in {self.import_seconds:.2f}s"
+                )
+        return self._module
+
+    @property
+    def is_loaded(self) -> bool:
+        return self._module is not None
+
+    def __getattr__(self, name):
+        return getattr(self._load(), name)
+
+    def __repr__(self):
+        state = "loaded" if self.is_loaded else "failed" if self._import_error else "pending"
+        return f"<LazyModule {self.module_name} ({state})>"
+
+
+def import_cost_report() -> dict:
+    """Per-module import cost of the core stack and of every lazy ML dependency"""
+    lazy_modules = {}
+    for name, module in LazyModule.registry.items():
+        lazy_modules[name] = {
+            "loaded": module.is_loaded,
+            "seconds": round(module.import_seconds, 3) if module.import_seconds is not None else None,
+            "error": str(module._import_error) if module._import_error else None
+        }
+    return {
+        "core_imports_seconds": round(CORE_IMPORT_SECONDS, 3),
+        "lazy_imports": lazy_modules
+    }
+
+
+def log_import_report():
+    """Log the startup import cost report"""
+    report = import_cost_report()
+    logger.info(f"⏱️ Core imports: {report['core_imports_seconds']:.2f}s")
+    for name, info in report["lazy_imports"].items():
+        if info["loaded"]:
+            logger.info(f"   {name}: {info['seconds']:.2f}s")
+        elif info["error"]:
+            logger.info(f"   {name}: unavailable ({info['error']})")
+        else:
+            logger.info(f"   {name}: not imported yet")
+
+
+# Heavy optional packages - only imported when a service actually needs them
+whisper = LazyModule("whisper")
+ollama = LazyModule("ollama")
+faiss = LazyModule("faiss")
+sentence_transformers = LazyModule("sentence_transformers")
+transformers = LazyModule("transformers")
+
+
+def pipeline(*args, **kwargs):
+    """Build a transformers pipeline, importing transformers on first use"""
+    return transformers.pipeline(*args, **kwargs)
 
 # Try to import PDF generation library separately
 try:
@@ -97,55 +193,12 @@ try:
 except ImportError as e:
     print(f"⚠️ PDF generation library not available: {e}")
     print("ℹ️ PDF export functions will use fallback mode")
-# ========================
-# SYSTEM CHECK
-# ========================
-import subprocess
 import platform
 import shutil
-import time
 
 # Vérifie si le système est Windows
 is_windows = platform.system() == "Windows"
 
-if not is_windows:
-    try:
-        # Vérifie si Ollama est déjà installé
-        ollama_path = shutil.which("ollama")
-        if not ollama_path:
-            print("📦 Ollama n'est pas installé. Installation en cours...")
-            subprocess.run("curl -fsSL https://ollama.com/install.sh | sh", shell=True, check=True)
-            print("✅ Ollama installé avec succès.")
-        else:
-            print("✅ Ollama est déjà installé.")
-
-        # Démarre Ollama (en arrière-plan)
-        print("🚀 Démarrage du serveur Ollama...")
-        subprocess.Popen("nohup ollama serve > ollama.log 2>&1 &", shell=True)
-
-        # Attendre que le serveur démarre
-        print("⏳ Attente du démarrage du serveur Ollama...")
-        time.sleep(10)
-
-        # Vérifie si le modèle est déjà présent
-        model_name = "llama3.1:8b"
-        print(f"🔍 Vérification si le modèle {model_name} est déjà téléchargé...")
-        result = subprocess.run("ollama list", shell=True, capture_output=True, text=True)
-
-        if model_name in result.stdout:
-            print(f"✅ Le modèle '{model_name}' est déjà présent.")
-        else:
-            print(f"⬇️ Téléchargement du modèle '{model_name}'...")
-            subprocess.run(f"ollama pull {model_name}", shell=True, check=True)
-            print(f"✅ Modèle '{model_name}' téléchargé avec succès.")
-
-    except subprocess.CalledProcessError as e:
-        print(f"❌ Erreur durant l'installation ou le démarrage d'Ollama : {e}")
-    except Exception as ex:
-        print(f"⚠️ Erreur inattendue : {ex}")
-else:
-    print("🚫 Le système est Windows. Ollama n'est pas pris en charge automatiquement sur cette plateforme.")
-
 
 # ========================
 # CONFIGURATION
@@ -154,7 +207,21 @@ class Config:
     SERVER_PORT = int(os.getenv("SERVER_PORT", "5000"))
     OLLAMA_HOST = os.getenv("OLLAMA_HOST", "http://localhost:11434")
     OLLAMA_MODEL = os.getenv("OLLAMA_MODEL", "llama3.1:8b")
+    # Start/pull Ollama ourselves; set to False when Ollama is managed externally
+    OLLAMA_MANAGE_SERVER = os.getenv("OLLAMA_MANAGE_SERVER", "True").lower() == "true"
+    OLLAMA_READY_TIMEOUT = float(os.getenv("OLLAMA_READY_TIMEOUT", "300"))
     LOCAL_WHISPER_MODEL = os.getenv("WHISPER_MODEL", "base")
+    WARMUP_WORKERS = int(os.getenv("WARMUP_WORKERS", "4"))
+    # How long the LLM warm-up waits for Ollama before counting as failed (and being retried)
+    WARMUP_OLLAMA_WAIT = float(os.getenv("WARMUP_OLLAMA_WAIT", "10"))
+    # Failed warm-ups are retried with exponential backoff, at most this many attempts in all
+    WARMUP_MAX_ATTEMPTS = int(os.getenv("WARMUP_MAX_ATTEMPTS", "8"))
+    PRELOAD_MODELS = os.getenv("PRELOAD_MODELS", "True").lower() == "true"
+    # Without preloading, warm every model in each serving process on its first
+    # request; turn off for API-only workers so models stay lazily loaded
+    WARMUP_ON_FIRST_REQUEST = os.getenv(
+        "WARMUP_ON_FIRST_REQUEST", "False" if PRELOAD_MODELS else "True"
+    ).lower() == "true"
     
     # Feature flags
     ENABLE_MOOD_TRACKING = os.getenv("ENABLE_MOOD_TRACKING", "True").lower() == "true"
@@ -164,10 +231,56 @@ class Config:
     ENABLE_ENCRYPTION = os.getenv("ENABLE_ENCRYPTION", "True").lower() == "true"
     
     # Security settings
-    ENCRYPTION_KEY = os.getenv("ENCRYPTION_KEY", Fernet.generate_key().decode())
+    # Master key wrapping each user's profile data key; when unset one is
+    # generated once and kept in ENCRYPTION_KEY_FILE
+    ENCRYPTION_KEY = os.getenv("ENCRYPTION_KEY", "")
+    ENCRYPTION_KEY_FILE = os.getenv("ENCRYPTION_KEY_FILE", "user_data/.encryption_key")
+    # Unwrapped per-user ciphers kept in memory
+    DATA_KEY_CACHE_SIZE = int(os.getenv("DATA_KEY_CACHE_SIZE", "10000"))
+    # Hot profiles kept in memory; colder ones are reloaded from disk on demand
+    MAX_CACHED_PROFILES = int(os.getenv("MAX_CACHED_PROFILES", "1000"))
+    # Mood entries go to an append-only log, folded into profile.enc once it
+    # holds at least this many entries (and at least half as many as the snapshot)
+    MOOD_LOG_COMPACT_MIN = int(os.getenv("MOOD_LOG_COMPACT_MIN", "50"))
+    # "files" (user_data/<id>/ directories) or "sqlite" (one database for every profile)
+    PROFILE_STORE = os.getenv("PROFILE_STORE", "files").lower()
+    PROFILE_DB_PATH = os.getenv("PROFILE_DB_PATH", "user_data/profiles.db")
+    # Profile changes are coalesced and written in the background this often
+    PROFILE_FLUSH_INTERVAL = float(os.getenv("PROFILE_FLUSH_INTERVAL", "1.0"))
+    # Signs session tokens; must be shared by every worker (preload_app forks after this is set)
+    SESSION_SECRET = os.getenv("SESSION_SECRET", "")
+    TOKEN_REVOCATION = os.getenv("TOKEN_REVOCATION", "True").lower() == "true"
+    REVOCATION_SYNC_SECONDS = float(os.getenv("REVOCATION_SYNC_SECONDS", "5"))
+    # scrypt cost (N must be a power of two) and how many hashes may run at once
+    PASSWORD_SCRYPT_N = int(os.getenv("PASSWORD_SCRYPT_N", "16384"))
+    PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(max(1, (os.cpu_count() or 2) // 2))))
+    PASSWORD_HASH_EXECUTOR = os.getenv("PASSWORD_HASH_EXECUTOR", "thread")  # "thread" or "process"
+    # Bloom filter answering "is this username/email free?" without SQLite
+    USER_FILTER_CAPACITY = int(os.getenv("USER_FILTER_CAPACITY", "1000000"))
+    USER_FILTER_ERROR_RATE = float(os.getenv("USER_FILTER_ERROR_RATE", "0.01"))
+    # username -> (id, password hash) cache in front of the users table
+    CREDENTIAL_CACHE_SIZE = int(os.getenv("CREDENTIAL_CACHE_SIZE", "50000"))
+    CREDENTIAL_CACHE_TTL = float(os.getenv("CREDENTIAL_CACHE_TTL", "300"))
+    CREDENTIAL_CACHE_PREWARM = os.getenv("CREDENTIAL_CACHE_PREWARM", "False").lower() == "true"
+    # Bulk provisioning endpoint is disabled unless a key is configured
+    ADMIN_API_KEY = os.getenv("ADMIN_API_KEY", "")
+    BULK_MAX_USERS = int(os.getenv("BULK_MAX_USERS", "10000"))
+    # Database retries: full-jitter backoff, bounded by a per-request deadline
+    RETRY_MAX_ATTEMPTS = int(os.getenv("RETRY_MAX_ATTEMPTS", "5"))
+    RETRY_BASE_DELAY = float(os.getenv("RETRY_BASE_DELAY", "0.05"))
+    RETRY_MAX_DELAY = float(os.getenv("RETRY_MAX_DELAY", "1.0"))
+    REQUEST_DEADLINE_SECONDS = float(os.getenv("REQUEST_DEADLINE_SECONDS", "5"))
+    SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "1000"))
+    # Background WAL checkpoint / optimize / incremental vacuum
+    DB_MAINTENANCE_INTERVAL = float(os.getenv("DB_MAINTENANCE_INTERVAL", "600"))
+    DB_MAINTENANCE_IDLE_QPS = float(os.getenv("DB_MAINTENANCE_IDLE_QPS", "5"))
+    DB_WAL_LIMIT_MB = float(os.getenv("DB_WAL_LIMIT_MB", "64"))
     MAX_HISTORY = 15
     CONVERSATION_DIR = "sessions"
     USER_DATA_DIR = "user_data"
+    SESSION_TTL_HOURS = float(os.getenv("SESSION_TTL_HOURS", "24"))
+    EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+    EMBEDDING_CACHE_DIR = os.getenv("EMBEDDING_CACHE_DIR", "embedding_cache")
 
 # ========================
 # LOGGING SETUP
@@ -182,213 +295,1635 @@ logging.basicConfig(
 )
 logger = logging.getLogger("MindMateAPI")
 
+# ========================
+# OLLAMA BOOTSTRAP
+# ========================
+class OllamaBootstrap:
+    """Starts Ollama in the background and polls its HTTP API until it is ready.
+
+    Nothing here blocks module import: routes check `is_ready()` and fall back
+    gracefully while the server or model is still coming up. Polling only
+    ends once the model is available or stop() is called: a server that
+    comes up after `ready_timeout`, or a model another process (the gunicorn
+    master) is still pulling, is picked up whenever it appears.
+    """
+    STARTING = "starting"
+    SERVER_UP = "server_up"
+    PULLING_MODEL = "pulling_model"
+    WAITING_FOR_MODEL = "waiting_for_model"
+    READY = "ready"
+    UNAVAILABLE = "unavailable"
+
+    def __init__(self, host: str, model: str, ready_timeout: float = 300.0,
+                 initial_delay: float = 0.25, max_delay: float = 5.0):
+        self.host = host
+        self.model = model
+        self.ready_timeout = ready_timeout
+        self.initial_delay = initial_delay
+        self.max_delay = max_delay
+        self.state = self.STARTING
+        self.last_error = None
+        self.probe_attempts = 0
+        self.available_models = []
+        self.started_at = None
+        self.ready_at = None
+        self.server_up_event = threading.Event()
+        self.ready_event = threading.Event()
+        self._stop_event = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._thread_pid = None
+
+    def start(self, manage_server: bool = True):
+        """Launch the bootstrap thread (idempotent per process)"""
+        with self._lock:
+            if self._thread and self._thread.is_alive() and self._thread_pid == os.getpid():
+                return
+            self._stop_event.clear()
+            self.started_at = time.time()
+            self._thread_pid = os.getpid()
+            self._thread = threading.Thread(
+                target=self._run, args=(manage_server,), name="ollama-bootstrap", daemon=True
+            )
+            self._thread.start()
+
+    def _run(self, manage_server: bool):
+        try:
+            if manage_server and self._probe_version() is None:
+                if is_windows:
+                    logger.warning("🚫 Le système est Windows. Ollama n'est pas pris en charge automatiquement sur cette plateforme.")
+                else:
+                    try:
+                        self._ensure_installed()
+                        self._launch_server()
+                    except Exception as e:
+                        # A server started some other way is still picked up below
+                        self.last_error = str(e)
+                        logger.error(f"❌ Could not start Ollama, waiting for an external server: {e}")
+            
+            if self._poll(self._probe_version) is None:
+                return  # stopped
+            self.server_up_event.set()
+            self._set_state(self.SERVER_UP)
+            logger.info(f"✅ Ollama service is running ({time.time() - self.started_at:.1f}s)")
+            
+            pulled = False
+            delay = self.initial_delay
+            while True:
+                models = self._poll(self._probe_tags)
+                if models is None:
+                    return  # stopped
+                if self.model in models:
+                    break
+                if manage_server and not pulled:
+                    pulled = True
+                    self._set_state(self.PULLING_MODEL)
+                    self._pull_model()
+                    continue
+                if self.state != self.WAITING_FOR_MODEL:
+                    self._set_state(self.WAITING_FOR_MODEL)
+                    logger.warning(f"⏳ Model {self.model} not in Ollama yet, still checking "
+                                   f"(available: {', '.join(self.available_models) or 'none'})")
+                if self._stop_event.wait(delay):
+                    return
+                delay = min(delay * 2, self.max_delay)
+            
+            self.ready_at = time.time()
+            self._set_state(self.READY)
+            self.ready_event.set()
+            logger.info(f"✅ Model {self.model} is available ({self.ready_at - self.started_at:.1f}s)")
+        except Exception as e:
+            self.last_error = str(e)
+            self._set_state(self.UNAVAILABLE)
+            logger.error(f"❌ Ollama bootstrap failed: {e}")
+
+    def _set_state(self, state: str):
+        with self._lock:
+            self.state = state
+
+    def _poll(self, probe):
+        """Call `probe` with exponential backoff until it returns a value; None only once stopped.
+
+        Past `ready_timeout` the state reads UNAVAILABLE, but polling goes on
+        every `max_delay` seconds.
+        """
+        deadline = time.time() + self.ready_timeout
+        delay = self.initial_delay
+        while not self._stop_event.is_set():
+            result = probe()
+            if result is not None:
+                return result
+            if deadline is not None and time.time() + delay > deadline:
+                deadline = None
+                self._set_state(self.UNAVAILABLE)
+                logger.error(f"❌ Ollama did not respond within {self.ready_timeout:.0f}s, "
+                             f"still retrying: {self.last_error}")
+            self._stop_event.wait(delay)
+            delay = min(delay * 2, self.max_delay)
+        return None
+
+    def stop(self):
+        """End polling; the bootstrap thread exits at its next check"""
+        self._stop_event.set()
+
+    def _probe_version(self):
+        """Return True once /api/version answers, None otherwise"""
+        self.probe_attempts += 1
+        try:
+            response = requests.get(f"{self.host}/api/version", timeout=2)
+            response.raise_for_status()
+            return True
+        except Exception as e:
+            self.last_error = str(e)
+            return None
+
+    def _probe_tags(self):
+        """Return the installed model names once /api/tags answers, None otherwise"""
+        self.probe_attempts += 1
+        try:
+            response = requests.get(f"{self.host}/api/tags", timeout=5)
+            response.raise_for_status()
+            self.available_models = [m["name"] for m in response.json().get("models", [])]
+            return self.available_models
+        except Exception as e:
+            self.last_error = str(e)
+            return None
+
+    def _ensure_installed(self):
+        # Vérifie si Ollama est déjà installé
+        if shutil.which("ollama"):
+            logger.info("✅ Ollama est déjà installé.")
+            return
+        logger.info("📦 Ollama n'est pas installé. Installation en cours...")
+        subprocess.run("curl -fsSL https://ollama.com/install.sh | sh", shell=True, check=True)
+        logger.info("✅ Ollama installé avec succès.")
+
+    def _launch_server(self):
+        # Démarre Ollama (en arrière-plan)
+        logger.info("🚀 Démarrage du serveur Ollama...")
+        with open("ollama.log", "ab") as log_file:
+            subprocess.Popen(
+                ["ollama", "serve"],
+                stdout=log_file,
+                stderr=subprocess.STDOUT,
+                start_new_session=True
+            )
+
+    def _pull_model(self):
+        logger.info(f"⬇️ Téléchargement du modèle '{self.model}'...")
+        try:
+            response = requests.post(
+                f"{self.host}/api/pull",
+                json={"model": self.model, "stream": False},
+                timeout=None
+            )
+            response.raise_for_status()
+            logger.info(f"✅ Modèle '{self.model}' téléchargé avec succès.")
+        except Exception as e:
+            self.last_error = str(e)
+            logger.error(f"❌ Erreur durant le téléchargement du modèle '{self.model}' : {e}")
+
+    def is_server_up(self) -> bool:
+        return self.server_up_event.is_set()
+
+    def is_ready(self) -> bool:
+        return self.ready_event.is_set()
+
+    def wait_until_ready(self, timeout: float = None) -> bool:
+        return self.ready_event.wait(timeout)
+
+    def status(self) -> dict:
+        return {
+            "state": self.state,
+            "ready": self.is_ready(),
+            "model": self.model,
+            "probe_attempts": self.probe_attempts,
+            "startup_seconds": round(self.ready_at - self.started_at, 2) if self.ready_at else None,
+            "last_error": None if self.is_ready() else self.last_error
+        }
+
+
+ollama_bootstrap = OllamaBootstrap(Config.OLLAMA_HOST, Config.OLLAMA_MODEL, Config.OLLAMA_READY_TIMEOUT)
+ollama_bootstrap.start(manage_server=Config.OLLAMA_MANAGE_SERVER)
+
+# ========================
+# RETRY POLICY
+# ========================
+# Absolute time.monotonic() by which the current request must be done retrying
+_retry_deadline = contextvars.ContextVar("retry_deadline", default=None)
+
+
+@contextmanager
+def retry_deadline(seconds: float):
+    """Bound every retry inside the block to `seconds` in total (nested blocks can only tighten it)"""
+    deadline = time.monotonic() + seconds
+    current = _retry_deadline.get()
+    token = _retry_deadline.set(deadline if current is None else min(current, deadline))
+    try:
+        yield
+    finally:
+        _retry_deadline.reset(token)
+
+
+def remaining_retry_budget() -> Optional[float]:
+    deadline = _retry_deadline.get()
+    return None if deadline is None else deadline - time.monotonic()
+
+
+class WriterBusyError(sqlite3.OperationalError):
+    """The single writer thread didn't get to a write within the caller's deadline"""
+
+
+def full_jitter_delay(attempt: int, base_delay: float, max_delay: float) -> float:
+    """Uniform in [0, min(max_delay, base_delay * 2**attempt)] so callers don't retry in lock-step"""
+    return random.uniform(0, min(max_delay, base_delay * 2 ** attempt))
+
+
+class RetryPolicy:
+    """The one place that decides whether, and how long, to wait before trying again.
+
+    Only transient SQLite errors are retried. Sleeps use full jitter and never
+    run past the deadline set with `retry_deadline`, so however many layers
+    call `run`, a request's total retry time stays within its budget. Counts
+    are kept per operation and reason for /api/metrics.
+    """
+    def __init__(self, max_attempts: int = 5, base_delay: float = 0.05, max_delay: float = 1.0):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._metrics = {}
+        self._lock = threading.Lock()
+    
+    @staticmethod
+    def classify(error: Exception) -> Optional[str]:
+        """Retry reason for a transient error, None when retrying can't help"""
+        if isinstance(error, WriterBusyError):
+            return "writer_busy"
+        if isinstance(error, sqlite3.OperationalError):
+            message = str(error).lower()
+            if "locked" in message or "busy" in message:
+                return "database_locked"
+            if "no database connection" in message:
+                return "no_connection"
+        return None
+    
+    def _count(self, operation: str, outcome: str):
+        with self._lock:
+            counts = self._metrics.setdefault(operation, {})
+            counts[outcome] = counts.get(outcome, 0) + 1
+    
+    def run(self, fn, operation: str):
+        """Call fn() until it succeeds, fails permanently, or the attempts/deadline run out"""
+        attempt = 0
+        while True:
+            try:
+                return fn()
+            except Exception as e:
+                reason = self.classify(e)
+                if reason is None:
+                    raise
+                attempt += 1
+                delay = full_jitter_delay(attempt, self.base_delay, self.max_delay)
+                remaining = remaining_retry_budget()
+                if attempt >= self.max_attempts:
+                    self._count(operation, f"{reason}:gave_up")
+                    raise
+                if remaining is not None and delay >= remaining:
+                    self._count(operation, f"{reason}:deadline")
+                    raise
+                self._count(operation, f"{reason}:retried")
+                logger.warning(f"{operation}: {reason} (attempt {attempt}/{self.max_attempts}), retrying in {delay:.2f}s")
+                time.sleep(delay)
+    
+    def stats(self) -> dict:
+        with self._lock:
+            return {operation: dict(counts) for operation, counts in self._metrics.items()}
+
+
+# Shared by every database call site
+db_retry_policy = RetryPolicy(
+    max_attempts=Config.RETRY_MAX_ATTEMPTS,
+    base_delay=Config.RETRY_BASE_DELAY,
+    max_delay=Config.RETRY_MAX_DELAY
+)
+
 # ========================
 # USER MANAGEMENT
 # ========================
+class SQLiteConnectionPool:
+    """Keeps one long-lived SQLite connection per thread.
+
+    PRAGMAs are applied once when a connection is created instead of on every
+    query. Connections are health-checked periodically, recycled after
+    `max_age` seconds or after an error, and never reused across a fork.
+    """
+    def __init__(self, db_path: str, timeout: float, busy_timeout: int,
+                 max_age: float = 3600.0, health_check_interval: float = 30.0):
+        self.db_path = db_path
+        self.timeout = timeout
+        self.busy_timeout = busy_timeout
+        self.max_age = max_age
+        self.health_check_interval = health_check_interval
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections = {}  # thread ident -> (thread, connection)
+        self.metrics = {
+            "created": 0,
+            "reused": 0,
+            "recycled": 0,
+            "health_check_failures": 0,
+            "errors": 0
+        }
+    
+    def _create_connection(self):
+        # Use a timeout to prevent database locking issues
+        conn = sqlite3.connect(self.db_path, timeout=self.timeout, check_same_thread=False)
+        # Enable WAL mode for better concurrency
+        conn.execute("PRAGMA journal_mode=WAL")
+        # Set a generous busy timeout
+        conn.execute(f"PRAGMA busy_timeout={self.busy_timeout}")
+        # Use the normal synchronization mode for better performance
+        conn.execute("PRAGMA synchronous=NORMAL")
+        # Enable foreign keys
+        conn.execute("PRAGMA foreign_keys=ON")
+        # Set a smaller cache size to reduce memory usage
+        conn.execute("PRAGMA cache_size=2000")
+        # page_size/auto_vacuum are file-level settings: see UserManager._init_db
+        # and SQLiteMaintenance, not per-connection PRAGMAs
+        
+        with self._lock:
+            self.metrics["created"] += 1
+            self._prune_dead_threads()
+            self._connections[threading.get_ident()] = (threading.current_thread(), conn)
+        return conn
+    
+    def _prune_dead_threads(self):
+        """Close connections owned by threads that have exited (caller holds the lock)"""
+        for ident, (thread, conn) in list(self._connections.items()):
+            if not thread.is_alive():
+                del self._connections[ident]
+                try:
+                    conn.close()
+                except Exception:
+                    pass
+    
+    def _is_healthy(self, conn) -> bool:
+        try:
+            conn.execute("SELECT 1").fetchone()
+            return True
+        except Exception:
+            with self._lock:
+                self.metrics["health_check_failures"] += 1
+            return False
+    
+    def _discard(self):
+        entry = getattr(self._local, "entry", None)
+        self._local.entry = None
+        if entry and entry["pid"] == os.getpid():
+            with self._lock:
+                self._connections.pop(threading.get_ident(), None)
+            try:
+                entry["conn"].close()
+            except Exception:
+                pass
+    
+    def acquire(self):
+        """Return this thread's connection, creating or recycling it as needed"""
+        entry = getattr(self._local, "entry", None)
+        now = time.monotonic()
+        
+        if entry is not None:
+            if entry["pid"] != os.getpid():
+                # Inherited from the parent process - never touch it
+                self._local.entry = None
+                entry = None
+            elif now - entry["created"] > self.max_age:
+                self._discard()
+                entry = None
+                with self._lock:
+                    self.metrics["recycled"] += 1
+            elif now - entry["checked"] > self.health_check_interval:
+                if self._is_healthy(entry["conn"]):
+                    entry["checked"] = now
+                else:
+                    self._discard()
+                    entry = None
+                    with self._lock:
+                        self.metrics["recycled"] += 1
+        
+        if entry is None:
+            entry = {"conn": self._create_connection(), "pid": os.getpid(), "created": now, "checked": now}
+            self._local.entry = entry
+        else:
+            with self._lock:
+                self.metrics["reused"] += 1
+        return entry["conn"]
+    
+    def release(self, conn, discard: bool = False):
+        """Hand the connection back; roll back anything left open, drop it if broken"""
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except Exception:
+            discard = True
+        if discard:
+            with self._lock:
+                self.metrics["errors"] += 1
+            self._discard()
+    
+    def close_all(self):
+        with self._lock:
+            for thread, conn in self._connections.values():
+                try:
+                    conn.close()
+                except Exception:
+                    pass
+            self._connections.clear()
+        self._local = threading.local()
+    
+    def stats(self) -> dict:
+        with self._lock:
+            self._prune_dead_threads()
+            return {**self.metrics, "open_connections": len(self._connections)}
+
+
+class SQLiteWriter:
+    """Serialises every database write through one dedicated thread.
+
+    Readers keep using their own pooled connections and, with WAL, run in
+    parallel with each other and with the writer. Since only this thread ever
+    writes, writers never fight over the database lock, and callers wait on a
+    future instead of holding a Python lock across retries and sleeps.
+    """
+    def __init__(self, pool: SQLiteConnectionPool, name: str = "sqlite-writer"):
+        self.pool = pool
+        self.name = name
+        self._queue = None
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self.executed = 0
+        self.failed = 0
+        self.timeouts = 0
+    
+    def _ensure_started(self):
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or self._pid != os.getpid() or not self._thread.is_alive():
+                # Threads don't survive fork, so each process gets its own writer
+                self._pid = os.getpid()
+                self._queue = queue.Queue()
+                self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._thread.start()
+    
+    def _run(self):
+        while True:
+            fn, future = self._queue.get()
+            if fn is None:
+                break
+            if not future.set_running_or_notify_cancel():
+                continue
+            conn = None
+            try:
+                conn = self.pool.acquire()
+                future.set_result(fn(conn))
+                self.executed += 1
+            except BaseException as e:
+                self.failed += 1
+                future.set_exception(e)
+            finally:
+                if conn is not None:
+                    self.pool.release(conn)
+    
+    def submit(self, fn) -> Future:
+        """Queue `fn(conn)` for the writer thread; the future carries its result"""
+        self._ensure_started()
+        future = Future()
+        self._queue.put((fn, future))
+        return future
+    
+    def execute(self, fn, timeout: float = None):
+        """Run `fn(conn)` on the writer thread and wait for its result.
+
+        Without an explicit `timeout` the wait is bounded by the current
+        `retry_deadline`, so a long job ahead in the queue can't hold a
+        request past its budget. A job that times out before it started is
+        cancelled; one already running still completes, but the caller gets
+        WriterBusyError either way.
+        """
+        if threading.current_thread() is self._thread:
+            # Already on the writer (nested write) - run inline
+            conn = self.pool.acquire()
+            try:
+                return fn(conn)
+            finally:
+                self.pool.release(conn)
+        if timeout is None:
+            timeout = remaining_retry_budget()
+            if timeout is not None:
+                timeout = max(timeout, 0.0)
+        future = self.submit(fn)
+        try:
+            return future.result(timeout)
+        except FutureTimeoutError:
+            self.timeouts += 1
+            if future.cancel():
+                raise WriterBusyError(f"{self.name} busy: write cancelled after {timeout:.2f}s in the queue")
+            raise WriterBusyError(f"{self.name} busy: write still running after {timeout:.2f}s")
+    
+    def stop(self, timeout: float = 5.0):
+        if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+            self._queue.put((None, None))
+            self._thread.join(timeout)
+    
+    def stats(self) -> dict:
+        return {
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "executed": self.executed,
+            "failed": self.failed,
+            "timeouts": self.timeouts
+        }
+
+
+class SQLiteMaintenance:
+    """Background housekeeping for one SQLite database.
+
+    Every `interval` seconds (polled in short ticks) it waits for a quiet
+    moment - fewer than `idle_qps` pooled connection checkouts per second -
+    and then, on the writer thread so it never races a write, runs
+    ``wal_checkpoint(TRUNCATE)``, ``PRAGMA optimize`` (which re-ANALYZEs
+    tables whose statistics went stale) and ``incremental_vacuum`` when free
+    pages pile up. A WAL larger than `wal_limit_mb` is checkpointed right
+    away whatever the traffic. An existing database created without
+    incremental auto-vacuum is converted once, with VACUUM, in a quiet window.
+
+    Start it in every serving process (after fork under gunicorn). Each one
+    publishes its checkout rate to ``<db>.activity`` every tick, and only the
+    process holding the ``<db>.maintenance.lock`` flock does the work, judging
+    quiet moments by the rate summed over all of them. When that process
+    exits its lock is released and another worker takes over.
+    """
+    def __init__(self, pool: SQLiteConnectionPool, writer: SQLiteWriter, interval: float = 600.0,
+                 idle_qps: float = 5.0, wal_limit_mb: float = 64.0, tick: float = 10.0, max_free_pages: int = 256):
+        self.pool = pool
+        self.writer = writer
+        self.interval = interval
+        self.idle_qps = idle_qps
+        self.wal_limit_bytes = int(wal_limit_mb * 1024 * 1024)
+        self.tick = tick
+        self.max_free_pages = max_free_pages
+        self._thread = None
+        self._pid = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self.activity_path = f"{pool.db_path}.activity"
+        self.leader_lock_path = f"{pool.db_path}.maintenance.lock"
+        self._leader_fd = None
+        self._leader_pid = None
+        self.last_run = None
+        self.last_checkpoint = None
+        self.last_qps = None
+        self.metrics = {"runs": 0, "forced_checkpoints": 0, "skipped_busy": 0, "vacuumed_pages": 0, "errors": 0}
+    
+    def start(self):
+        """Start the scheduler thread in this process (idempotent, fork-aware)"""
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+                return
+            self._pid = os.getpid()
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="sqlite-maintenance", daemon=True)
+            self._thread.start()
+    
+    def stop(self):
+        self._stop.set()
+        with self._lock:
+            if self._leader_fd is not None and self._leader_pid == os.getpid():
+                os.close(self._leader_fd)  # releases the flock for the next worker
+            self._leader_fd = None
+    
+    @property
+    def is_leader(self) -> bool:
+        return self._leader_fd is not None and self._leader_pid == os.getpid()
+    
+    def _try_lead(self) -> bool:
+        """Become the one process doing maintenance for this database, if none is"""
+        if self.is_leader:
+            return True
+        if fcntl is None:
+            return True  # no flock: assume a single process
+        fd = os.open(self.leader_lock_path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return False
+        # A descriptor inherited through fork isn't ours; never close it here
+        self._leader_fd, self._leader_pid = fd, os.getpid()
+        logger.info(f"🧹 Process {os.getpid()} runs maintenance for {self.pool.db_path}")
+        return True
+    
+    def _publish_activity(self, qps: float) -> float:
+        """Record this process's checkout rate; return the rate summed over live processes"""
+        now = time.time()
+        fd = os.open(self.activity_path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            if fcntl is not None:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+            with os.fdopen(os.dup(fd), "r+", encoding="utf-8") as f:
+                try:
+                    activity = json.load(f)
+                except ValueError:
+                    activity = {}
+                activity[str(os.getpid())] = {"qps": qps, "at": now}
+                # Processes that stopped reporting have exited
+                activity = {pid: entry for pid, entry in activity.items() if now - entry["at"] < 3 * self.tick}
+                f.seek(0)
+                f.truncate()
+                json.dump(activity, f)
+        finally:
+            os.close(fd)
+        return sum(entry["qps"] for entry in activity.values())
+    
+    def _checkouts(self) -> int:
+        stats = self.pool.stats()
+        return stats["created"] + stats["reused"]
+    
+    def wal_size(self) -> int:
+        try:
+            return os.path.getsize(f"{self.pool.db_path}-wal")
+        except OSError:
+            return 0
+    
+    def _run(self):
+        # Stagger workers so they don't all checkpoint at the same moment
+        last_run = time.time() - random.uniform(0, self.interval / 2)
+        last_checkouts, last_tick = self._checkouts(), time.time()
+        while not self._stop.wait(self.tick):
+            now = time.time()
+            checkouts = self._checkouts()
+            qps = (checkouts - last_checkouts) / max(now - last_tick, 1e-6)
+            last_checkouts, last_tick = checkouts, now
+            try:
+                self.last_qps = qps = self._publish_activity(qps)
+                if not self._try_lead():
+                    continue
+                if self.wal_size() > self.wal_limit_bytes:
+                    self.metrics["forced_checkpoints"] += 1
+                    self.writer.execute(self._checkpoint)
+                if now - last_run < self.interval:
+                    continue
+                if qps > self.idle_qps:
+                    self.metrics["skipped_busy"] += 1
+                    continue
+                self.run_once()
+                last_run = now
+            except Exception as e:
+                self.metrics["errors"] += 1
+                logger.warning(f"Database maintenance failed: {e}")
+    
+    def _checkpoint(self, conn):
+        busy, wal_frames, checkpointed = conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchone()
+        self.last_checkpoint = {"busy": bool(busy), "wal_frames": wal_frames, "checkpointed": checkpointed}
+    
+    def _maintain(self, conn):
+        if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+            # Only takes effect on an existing file through a full VACUUM
+            logger.info("🧹 Converting database to incremental auto-vacuum")
+            conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+            conn.execute("VACUUM")
+        conn.execute("PRAGMA optimize")
+        conn.commit()
+        free_pages = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        if free_pages > self.max_free_pages:
+            # Frees one page per VM step; Cursor.execute stops after the first,
+            # executescript runs it to completion
+            conn.executescript(f"PRAGMA incremental_vacuum({free_pages});")
+            self.metrics["vacuumed_pages"] += free_pages
+        self._checkpoint(conn)
+    
+    def run_once(self):
+        """Run every maintenance step now, on the writer thread"""
+        started = time.time()
+        self.writer.execute(self._maintain)
+        self.metrics["runs"] += 1
+        self.last_run = datetime.now().isoformat()
+        logger.info(f"🧹 Database maintenance done in {time.time() - started:.2f}s "
+                    f"(WAL {self.wal_size() // 1024} KB)")
+    
+    def stats(self) -> dict:
+        page_info = {}
+        conn = None
+        try:
+            conn = self.pool.acquire()
+            for pragma in ("page_count", "page_size", "freelist_count", "auto_vacuum"):
+                page_info[pragma] = conn.execute(f"PRAGMA {pragma}").fetchone()[0]
+        except Exception as e:
+            page_info["error"] = str(e)
+        finally:
+            if conn is not None:
+                self.pool.release(conn)
+        return {
+            **self.metrics,
+            **page_info,
+            "wal_size_bytes": self.wal_size(),
+            "leader": self.is_leader,
+            "total_qps": self.last_qps,
+            "last_run": self.last_run,
+            "last_checkpoint": self.last_checkpoint
+        }
+
+
+def _scrypt_digest(password: str, salt: bytes, n: int, r: int, p: int) -> bytes:
+    """Module-level so a process pool can pickle it"""
+    return hashlib.scrypt(password.encode("utf-8"), salt=salt, n=n, r=r, p=p, maxmem=256 * n * r + 2 ** 20, dklen=32)
+
+
+class PasswordHasher:
+    """scrypt password hashing on a bounded executor.
+
+    Hashes are stored as ``scrypt$n$r$p$salt$hash``. At most `max_workers`
+    derivations run at once; further logins queue on the executor instead of
+    saturating every core, and the request thread only waits on a Future.
+    OpenSSL's scrypt releases the GIL, so a thread pool already runs hashes in
+    parallel; `executor="process"` is available for isolation. Legacy unsalted
+    SHA-256 hashes still verify and are flagged for rehashing.
+    """
+    def __init__(self, n: int = 16384, r: int = 8, p: int = 1, max_workers: int = 2, executor: str = "thread"):
+        self.n = n
+        self.r = r
+        self.p = p
+        self.max_workers = max_workers
+        self.executor_kind = executor
+        self._executor = None
+        self._executor_pid = None
+        self._lock = threading.Lock()
+        self.metrics = {"hashed": 0, "verified": 0, "legacy_verified": 0, "rehashed": 0, "dummy_verified": 0}
+        # Fixed salt and digest for verify_dummy(); no password derives to it
+        self._dummy_salt = secrets.token_bytes(16)
+        self._dummy_digest = secrets.token_bytes(32)
+    
+    def _get_executor(self):
+        # Pools don't survive fork, so each worker process builds its own
+        with self._lock:
+            if self._executor is None or self._executor_pid != os.getpid():
+                if self.executor_kind == "process":
+                    self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+                else:
+                    self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="pwhash")
+                self._executor_pid = os.getpid()
+            return self._executor
+    
+    def _derive(self, password: str, salt: bytes, n: int, r: int, p: int) -> bytes:
+        return self._get_executor().submit(_scrypt_digest, password, salt, n, r, p).result()
+    
+    def _format(self, salt: bytes, digest: bytes) -> str:
+        self.metrics["hashed"] += 1
+        return "$".join([
+            "scrypt", str(self.n), str(self.r), str(self.p),
+            base64.b64encode(salt).decode("ascii"), base64.b64encode(digest).decode("ascii")
+        ])
+    
+    def hash(self, password: str) -> str:
+        salt = secrets.token_bytes(16)
+        return self._format(salt, self._derive(password, salt, self.n, self.r, self.p))
+    
+    def hash_async(self, password: str) -> Future:
+        """Queue a hash without waiting for it; the Future resolves to the encoded hash"""
+        salt = secrets.token_bytes(16)
+        result = Future()
+        
+        def done(digest_future):
+            try:
+                result.set_result(self._format(salt, digest_future.result()))
+            except Exception as e:
+                result.set_exception(e)
+        self._get_executor().submit(_scrypt_digest, password, salt, self.n, self.r, self.p).add_done_callback(done)
+        return result
+    
+    @staticmethod
+    def is_legacy(stored_hash: str) -> bool:
+        return not stored_hash.startswith("scrypt$")
+    
+    def needs_rehash(self, stored_hash: str) -> bool:
+        if self.is_legacy(stored_hash):
+            return True
+        _, n, r, p, _, _ = stored_hash.split("$")
+        return (int(n), int(r), int(p)) != (self.n, self.r, self.p)
+    
+    def verify(self, password: str, stored_hash: str) -> bool:
+        if not stored_hash:
+            return False
+        if self.is_legacy(stored_hash):
+            self.metrics["legacy_verified"] += 1
+            candidate = hashlib.sha256(password.encode()).hexdigest()
+            return hmac.compare_digest(candidate, stored_hash)
+        try:
+            _, n, r, p, salt, expected = stored_hash.split("$")
+            digest = self._derive(password, base64.b64decode(salt), int(n), int(r), int(p))
+        except ValueError as e:
+            logger.error(f"Malformed password hash: {e}")
+            return False
+        self.metrics["verified"] += 1
+        return hmac.compare_digest(digest, base64.b64decode(expected))
+    
+    def verify_dummy(self, password: str) -> bool:
+        """Do the work of verify() for a username that doesn't exist; always False.
+
+        Without it an unknown username returns before any KDF runs, so the
+        response time tells which usernames are registered.
+        """
+        self.metrics["dummy_verified"] += 1
+        digest = self._derive(password, self._dummy_salt, self.n, self.r, self.p)
+        hmac.compare_digest(digest, self._dummy_digest)
+        return False
+    
+    def stats(self) -> dict:
+        executor = self._executor
+        queued = executor._work_queue.qsize() if isinstance(executor, ThreadPoolExecutor) else None
+        return {**self.metrics, "executor": self.executor_kind, "max_workers": self.max_workers, "queued": queued}
+
+
+class BloomFilter:
+    """Fixed-size Bloom filter over strings.
+
+    `might_contain` never returns a false negative for keys added in this
+    process, and returns a false positive with roughly `error_rate`
+    probability while fewer than `capacity` keys have been added.
+    """
+    def __init__(self, capacity: int = 1000000, error_rate: float = 0.01):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.num_bits = max(64, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.num_hashes = max(1, round(self.num_bits / capacity * math.log(2)))
+        self._bits = bytearray((self.num_bits + 7) // 8)
+        self._lock = threading.Lock()
+        self.count = 0
+    
+    def _positions(self, key: str):
+        # Double hashing: two 64-bit halves of one digest give all k positions
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.num_bits for i in range(self.num_hashes)]
+    
+    def add(self, key: str):
+        positions = self._positions(key)
+        with self._lock:
+            for pos in positions:
+                self._bits[pos >> 3] |= 1 << (pos & 7)
+            self.count += 1
+    
+    def might_contain(self, key: str) -> bool:
+        bits = self._bits
+        return all(bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(key))
+    
+    def stats(self) -> dict:
+        fill = self.count / self.capacity if self.capacity else 1.0
+        return {
+            "keys": self.count,
+            "capacity": self.capacity,
+            "size_kb": len(self._bits) // 1024,
+            "hashes": self.num_hashes,
+            "estimated_fp_rate": round((1 - math.exp(-self.num_hashes * fill)) ** self.num_hashes, 6)
+        }
+
+
+class CredentialCache:
+    """Bounded LRU of username -> (user_id, password_hash) for logins.
+
+    Entries expire after `ttl` seconds so a change made by another worker
+    process is picked up eventually; changes made here invalidate at once.
+    Only existing users are cached - unknown usernames always go to SQLite.
+    """
+    def __init__(self, max_size: int = 50000, ttl: float = 300.0):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()  # username -> (user_id, password_hash, expires_at)
+        self._lock = threading.Lock()
+        self.metrics = {"hits": 0, "misses": 0, "evictions": 0, "invalidations": 0}
+    
+    def get(self, username: str) -> Optional[Tuple[str, str]]:
+        with self._lock:
+            entry = self._entries.get(username)
+            if entry and entry[2] > time.monotonic():
+                self._entries.move_to_end(username)
+                self.metrics["hits"] += 1
+                return entry[0], entry[1]
+            if entry:
+                del self._entries[username]
+            self.metrics["misses"] += 1
+            return None
+    
+    def put(self, username: str, user_id: str, password_hash: str):
+        with self._lock:
+            self._entries[username] = (user_id, password_hash, time.monotonic() + self.ttl)
+            self._entries.move_to_end(username)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.metrics["evictions"] += 1
+    
+    def invalidate(self, username: str):
+        with self._lock:
+            if self._entries.pop(username, None):
+                self.metrics["invalidations"] += 1
+    
+    def __len__(self):
+        return len(self._entries)
+    
+    def stats(self) -> dict:
+        lookups = self.metrics["hits"] + self.metrics["misses"]
+        return {
+            **self.metrics,
+            "size": len(self._entries),
+            "hit_ratio": round(self.metrics["hits"] / lookups, 4) if lookups else None
+        }
+
+
+class FallbackUserStore:
+    """In-memory user store used while SQLite is unavailable.
+
+    Users are indexed by id, username and email so every lookup is O(1), no
+    matter how many accounts pile up during a long database outage. Mutations
+    take a lock so the three indexes always agree.
+    """
+    def __init__(self):
+        self._users = {}
+        self._by_username = {}
+        self._by_email = {}
+        self._lock = threading.Lock()
+    
+    def __len__(self):
+        return len(self._users)
+    
+    def __contains__(self, user_id):
+        return user_id in self._users
+    
+    def get(self, user_id: str) -> Optional[dict]:
+        return self._users.get(user_id)
+    
+    def find_conflict(self, username: str, email: str) -> Optional[str]:
+        """Return "username" or "email" if either is already taken, else None"""
+        if username in self._by_username:
+            return "username"
+        if email in self._by_email:
+            return "email"
+        return None
+    
+    def get_credentials(self, username: str) -> Optional[Tuple[str, str]]:
+        """Return (user_id, password_hash) for a username"""
+        user_id = self._by_username.get(username)
+        user_data = self._users.get(user_id) if user_id else None
+        if user_data:
+            return user_id, user_data["password_hash"]
+        return None
+    
+    def update_password_hash(self, user_id: str, password_hash: str):
+        with self._lock:
+            if user_id in self._users:
+                self._users[user_id]["password_hash"] = password_hash
+    
+    def add(self, user_id: str, username: str, password_hash: str, email: str) -> dict:
+        """Atomically check for duplicates and insert"""
+        with self._lock:
+            duplicate_field = self.find_conflict(username, email)
+            if duplicate_field:
+                raise ValueError(f"The {duplicate_field} already exists")
+            user_data = {
+                "username": username,
+                "password_hash": password_hash,
+                "email": email,
+                "created_at": datetime.now().isoformat()
+            }
+            self._users[user_id] = user_data
+            self._by_username[username] = user_id
+            self._by_email[email] = user_id
+            return user_data
+    
+    def remove(self, user_id: str) -> Optional[dict]:
+        with self._lock:
+            user_data = self._users.pop(user_id, None)
+            if user_data:
+                self._by_username.pop(user_data["username"], None)
+                self._by_email.pop(user_data["email"], None)
+            return user_data
+    
+    def items(self) -> List[Tuple[str, dict]]:
+        """Snapshot of (user_id, user_data) pairs"""
+        with self._lock:
+            return list(self._users.items())
+
+
+class UserWriteBehindQueue:
+    """Single background worker that writes fallback users to SQLite in batches.
+
+    Users created while the database was failing are queued here instead of
+    each getting its own retry thread. The worker drains the queue with one
+    `executemany` per batch inside a single transaction, backs off with jitter
+    while the database keeps failing, and mirrors the queue to a JSON file so a
+    restart doesn't lose anyone.
+
+    Each process keeps its own queue file, ``<prefix>.<pid>.json``: a forked
+    worker starts with an empty queue rather than the parent's copy, and on
+    first use adopts the files of processes that no longer run (and a legacy
+    ``<prefix>.json``). Users that turn out to conflict with a database user
+    are appended to `conflicts_path` and dropped from the fallback store.
+    """
+    def __init__(self, writer: SQLiteWriter, fallback_store: FallbackUserStore, queue_prefix: str,
+                 conflicts_path: str, batch_size: int = 100, initial_delay: float = 10.0, max_delay: float = 300.0):
+        self.writer = writer
+        self.fallback_store = fallback_store
+        self.queue_prefix = queue_prefix
+        self.queue_path = None
+        self.conflicts_path = conflicts_path
+        self.batch_size = batch_size
+        self.initial_delay = initial_delay
+        self.max_delay = max_delay
+        self._pending = {}  # user_id -> user data, in insertion order
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._pid = None
+        self._owner_pid = None
+        self.consecutive_failures = 0
+        self.persisted = 0
+        self.conflicts = 0
+        self.last_error = None
+    
+    @property
+    def depth(self) -> int:
+        return len(self._pending)
+    
+    def start(self):
+        """Adopt orphaned queue files and start the worker in this process"""
+        with self._lock:
+            self._claim_process_locked()
+        if self._pending:
+            self._ensure_started()
+    
+    def enqueue(self, user_id: str, user_data: dict):
+        with self._lock:
+            self._claim_process_locked()
+            self._pending[user_id] = dict(user_data)
+            self._save_locked()
+        self._ensure_started()
+    
+    def _claim_process_locked(self):
+        """Switch to this process's own queue file; caller holds the lock"""
+        if self._owner_pid == os.getpid():
+            return
+        # A forked child: the queue it inherited belongs to (and is written by) its parent
+        self._owner_pid = os.getpid()
+        self._pending = {}
+        self.queue_path = f"{self.queue_prefix}.{os.getpid()}.json"
+        self._restore_locked()
+    
+    def _orphaned_files(self) -> List[str]:
+        directory, prefix = os.path.split(self.queue_prefix)
+        orphans = []
+        for name in os.listdir(directory or "."):
+            if not (name.startswith(f"{prefix}.") and name.endswith(".json")):
+                continue
+            owner = name[len(prefix) + 1:-len(".json")].split(".")[0]
+            if owner.isdigit() and int(owner) != os.getpid():
+                try:
+                    os.kill(int(owner), 0)
+                    continue  # another live worker's queue
+                except ProcessLookupError:
+                    pass
+                except PermissionError:
+                    continue
+            orphans.append(os.path.join(directory, name))
+        return orphans
+    
+    def _restore_locked(self):
+        """Adopt users queued by processes that are gone (e.g. before a restart); caller holds the lock"""
+        adopted = []
+        for path in self._orphaned_files():
+            # Renaming claims the file: only one of the workers starting together gets it
+            claimed = path
+            if not path.startswith(f"{self.queue_prefix}.{os.getpid()}."):
+                claimed = f"{self.queue_prefix}.{os.getpid()}.adopted-{uuid.uuid4().hex}.json"
+            try:
+                if claimed != path:
+                    os.replace(path, claimed)
+                with open(claimed, "r", encoding="utf-8") as f:
+                    self._pending.update(json.load(f))
+            except FileNotFoundError:
+                continue
+            except Exception as e:
+                logger.error(f"Could not read pending user queue {path}: {e}")
+                continue
+            adopted.append(claimed)
+        if not adopted:
+            return
+        for user_id, user_data in self._pending.items():
+            if user_id not in self.fallback_store:
+                try:
+                    self.fallback_store.add(user_id, user_data["username"], user_data["password_hash"], user_data["email"])
+                except ValueError:
+                    pass
+        # Own file first, so a crash in between never loses the adopted users
+        self._save_locked()
+        for path in adopted:
+            if path != self.queue_path:
+                os.remove(path)
+        logger.info(f"📥 Restored {len(self._pending)} pending user insert(s) into {self.queue_path}")
+    
+    def _save_locked(self):
+        """Mirror the queue to disk (temp file + atomic rename); caller holds the lock"""
+        try:
+            if not self._pending:
+                if os.path.exists(self.queue_path):
+                    os.remove(self.queue_path)
+                return
+            tmp_path = f"{self.queue_path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self._pending, f)
+            os.replace(tmp_path, self.queue_path)
+        except Exception as e:
+            logger.error(f"Could not persist pending user queue: {e}")
+    
+    def _ensure_started(self):
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name="user-write-behind", daemon=True)
+            self._thread.start()
+    
+    def _run(self):
+        delay = self.initial_delay
+        while True:
+            self._wakeup.wait(delay)
+            self._wakeup.clear()
+            if not self._pending:
+                delay = self.initial_delay
+                continue
+            try:
+                self.flush()
+                self.consecutive_failures = 0
+                delay = self.initial_delay
+            except Exception as e:
+                self.consecutive_failures += 1
+                self.last_error = str(e)
+                # Full jitter so several workers don't retry in lock-step
+                delay = full_jitter_delay(self.consecutive_failures, self.initial_delay, self.max_delay)
+                logger.warning(f"Write-behind flush failed ({self.depth} pending, retry in {delay:.1f}s): {e}")
+    
+    def _insert_batch(self, conn, batch: List[Tuple[str, dict]]) -> Tuple[List[str], List[str]]:
+        """Runs on the writer thread: insert one batch in a single transaction"""
+        ids = [user_id for user_id, _ in batch]
+        usernames = [user_data["username"] for _, user_data in batch]
+        emails = [user_data["email"] for _, user_data in batch]
+        marks = ",".join("?" * len(batch))
+        cursor = conn.cursor()
+        try:
+            cursor.execute("BEGIN IMMEDIATE TRANSACTION")
+            cursor.execute(
+                f"SELECT id, username, email FROM users WHERE id IN ({marks}) OR username IN ({marks}) OR email IN ({marks})",
+                ids + usernames + emails
+            )
+            existing_ids, taken = set(), set()
+            for row_id, row_username, row_email in cursor.fetchall():
+                existing_ids.add(row_id)
+                taken.update((("username", row_username), ("email", row_email)))
+            
+            rows, done, conflicts = [], [], []
+            for user_id, user_data in batch:
+                if user_id in existing_ids:
+                    done.append(user_id)  # Already persisted earlier
+                elif ("username", user_data["username"]) in taken or ("email", user_data["email"]) in taken:
+                    conflicts.append(user_id)
+                else:
+                    created_at = user_data.get("created_at")
+                    if created_at:
+                        # Same "YYYY-MM-DD HH:MM:SS" layout as CURRENT_TIMESTAMP
+                        created_at = datetime.fromisoformat(created_at).strftime("%Y-%m-%d %H:%M:%S")
+                    rows.append((user_id, user_data["username"], user_data["password_hash"],
+                                 user_data["email"], created_at))
+                    done.append(user_id)
+            
+            cursor.executemany('''
+                INSERT INTO users (id, username, password_hash, email, created_at)
+                VALUES (?, ?, ?, ?, COALESCE(?, CURRENT_TIMESTAMP))
+            ''', rows)
+            conn.commit()
+            return done, conflicts
+        except Exception:
+            conn.rollback()
+            raise
+    
+    def _record_conflicts(self, conflicts: List[Tuple[str, dict]]):
+        """Append conflicting users to the conflicts file (fsynced) for manual review"""
+        lines = "".join(
+            json.dumps({"user_id": user_id, "dropped_at": datetime.now().isoformat(), **user_data}) + "\n"
+            for user_id, user_data in conflicts
+        )
+        fd = os.open(self.conflicts_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+        try:
+            os.write(fd, lines.encode("utf-8"))
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+    
+    def flush(self):
+        """Drain the queue batch by batch; raises if the database is still failing"""
+        with self._lock:
+            self._claim_process_locked()
+        while self._pending:
+            with self._lock:
+                batch = list(self._pending.items())[:self.batch_size]
+            done, conflicts = self.writer.execute(lambda conn: self._insert_batch(conn, batch))
+            if conflicts:
+                # Recorded before leaving the queue file, so they are never just lost
+                batch_data = dict(batch)
+                self._record_conflicts([(user_id, batch_data[user_id]) for user_id in conflicts])
+            
+            with self._lock:
+                for user_id in done + conflicts:
+                    self._pending.pop(user_id, None)
+                self._save_locked()
+            # SQLite is the source of truth again; a conflicting user must
+            # not keep logging in from the fallback store either
+            for user_id in done + conflicts:
+                self.fallback_store.remove(user_id)
+            for user_id in conflicts:
+                logger.error(f"Pending user {user_id} conflicts with an existing database user, "
+                             f"dropped from queue and recorded in {self.conflicts_path}")
+            self.persisted += len(done)
+            self.conflicts += len(conflicts)
+            logger.info(f"Write-behind persisted {len(done)} user(s), {self.depth} still pending")
+    
+    def stats(self) -> dict:
+        return {
+            "queue_depth": self.depth,
+            "queue_path": self.queue_path,
+            "persisted": self.persisted,
+            "conflicts": self.conflicts,
+            "consecutive_failures": self.consecutive_failures,
+            "last_error": self.last_error
+        }
+
+
+class SignedTokenCodec:
+    """Stateless HMAC-SHA256 session tokens: ``v1.<payload>.<signature>``.
+
+    The payload carries the user id, issue time, expiry and a random token id
+    (jti), so verification is pure CPU work with no shared state and any
+    worker holding the same secret accepts any token.
+    """
+    PREFIX = "v1"
+    
+    def __init__(self, secret: str):
+        if not secret:
+            secret = secrets.token_urlsafe(48)
+            logger.warning("⚠️ SESSION_SECRET not set - using a random secret, tokens will not survive a restart")
+        self._key = secret.encode("utf-8")
+    
+    @staticmethod
+    def _b64encode(raw: bytes) -> str:
+        return base64.urlsafe_b64encode(raw).rstrip(b"=").decode("ascii")
+    
+    @staticmethod
+    def _b64decode(text: str) -> bytes:
+        return base64.urlsafe_b64decode(text + "=" * (-len(text) % 4))
+    
+    def _sign(self, message: bytes) -> str:
+        return self._b64encode(hmac.new(self._key, message, hashlib.sha256).digest())
+    
+    def is_signed(self, token: str) -> bool:
+        return token.startswith(self.PREFIX + ".")
+    
+    def encode(self, user_id: str, ttl_seconds: float) -> str:
+        now = int(time.time())
+        payload = {"uid": user_id, "iat": now, "exp": now + int(ttl_seconds), "jti": secrets.token_urlsafe(12)}
+        body = self._b64encode(json.dumps(payload, separators=(",", ":")).encode("utf-8"))
+        signing_input = f"{self.PREFIX}.{body}"
+        return f"{signing_input}.{self._sign(signing_input.encode('ascii'))}"
+    
+    def decode(self, token: str) -> Optional[dict]:
+        """Return the payload of a valid, unexpired token, else None"""
+        try:
+            prefix, body, signature = token.split(".")
+        except ValueError:
+            return None
+        if prefix != self.PREFIX:
+            return None
+        expected = self._sign(f"{prefix}.{body}".encode("ascii"))
+        if not hmac.compare_digest(expected, signature):
+            return None
+        try:
+            payload = json.loads(self._b64decode(body))
+        except (ValueError, UnicodeDecodeError):
+            return None
+        if not isinstance(payload, dict) or payload.get("exp", 0) <= time.time():
+            return None
+        return payload
+
+
+class TokenRevocationList:
+    """Revoked token ids shared through SQLite and mirrored in memory.
+
+    Checks are a set lookup; each worker pulls rows revoked since its last sync
+    at most every `sync_interval` seconds, so a logout takes effect on other
+    workers within that window. Rows are dropped once the token would have
+    expired anyway.
+    """
+    def __init__(self, pool: SQLiteConnectionPool, writer: SQLiteWriter, table: str = "revoked_tokens",
+                 sync_interval: float = 5.0):
+        self.pool = pool
+        self.writer = writer
+        self.table = table
+        self.sync_interval = sync_interval
+        self._revoked = {}  # jti -> expires_at
+        self._lock = threading.Lock()
+        self._last_sync = 0.0
+        self._synced_until = 0.0
+        self.metrics = {"revoked": 0, "syncs": 0, "db_errors": 0}
+        
+        def create_table(conn):
+            try:
+                conn.execute(f'''
+                    CREATE TABLE IF NOT EXISTS {self.table} (
+                        jti TEXT PRIMARY KEY,
+                        revoked_at REAL NOT NULL,
+                        expires_at REAL NOT NULL
+                    )
+                ''')
+                conn.execute(f"CREATE INDEX IF NOT EXISTS idx_{self.table}_revoked_at ON {self.table} (revoked_at)")
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+        try:
+            self.writer.execute(create_table)
+        except Exception as e:
+            self.metrics["db_errors"] += 1
+            logger.error(f"Could not create {self.table} table, revocations will be local to this worker: {e}")
+    
+    def revoke(self, jti: str, expires_at: float):
+        now = time.time()
+        with self._lock:
+            self._revoked[jti] = expires_at
+        self.metrics["revoked"] += 1
+        
+        def insert(conn):
+            try:
+                conn.execute(f"DELETE FROM {self.table} WHERE expires_at <= ?", (now,))
+                conn.execute(
+                    f"INSERT OR REPLACE INTO {self.table} (jti, revoked_at, expires_at) VALUES (?, ?, ?)",
+                    (jti, now, expires_at)
+                )
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+        try:
+            self.writer.execute(insert)
+        except Exception as e:
+            self.metrics["db_errors"] += 1
+            logger.error(f"Could not persist token revocation: {e}")
+    
+    def _sync(self, now: float):
+        conn = None
+        try:
+            conn = self.pool.acquire()
+            # Small overlap so a row committed while we were reading is not missed
+            rows = conn.execute(
+                f"SELECT jti, revoked_at, expires_at FROM {self.table} WHERE revoked_at >= ? AND expires_at > ?",
+                (self._synced_until - 1.0, now)
+            ).fetchall()
+        except Exception as e:
+            self.metrics["db_errors"] += 1
+            logger.warning(f"Revocation list sync failed: {e}")
+            return
+        finally:
+            if conn is not None:
+                self.pool.release(conn)
+        with self._lock:
+            for jti, revoked_at, expires_at in rows:
+                self._revoked[jti] = expires_at
+                self._synced_until = max(self._synced_until, revoked_at)
+            for jti in [j for j, exp in self._revoked.items() if exp <= now]:
+                del self._revoked[jti]
+        self.metrics["syncs"] += 1
+    
+    def is_revoked(self, jti: str) -> bool:
+        now = time.time()
+        if now - self._last_sync >= self.sync_interval:
+            self._last_sync = now
+            self._sync(now)
+        return jti in self._revoked
+    
+    def stats(self) -> dict:
+        return {**self.metrics, "size": len(self._revoked)}
+
+
 class UserManager:
     def __init__(self, db_path="users.db"):
         self.db_path = db_path
-        # Add a lock for thread-safe database operations
-        self.db_lock = threading.RLock()
         # Initialize fallback storage regardless of DB status
-        self.fallback_users = {}
+        self.fallback_users = FallbackUserStore()
         # Database connection settings
-        self.connection_timeout = 180.0  # 3 minutes timeout for connecting (increased)
-        self.busy_timeout = 120000  # 120 seconds for busy timeout (increased)
-        # Keep a list of pending operations for retries
-        self.pending_operations = []
-        # Global connection object
-        self.global_connection = None
-        # Connection counter to track usage
-        self.connection_counter = 0
-        # Maximum number of retries for operations
-        self.max_retries = 5  # Increased from 3
-        # Base delay between retries (in seconds)
-        self.base_retry_delay = 0.5
+        # Kept short: one attempt waits at most this long on a lock, and
+        # db_retry_policy decides whether another attempt fits the deadline
+        self.connection_timeout = Config.SQLITE_BUSY_TIMEOUT_MS / 1000
+        self.busy_timeout = Config.SQLITE_BUSY_TIMEOUT_MS
+        # Long-lived per-thread connections; reads run on these concurrently (WAL)
+        self.db_pool = SQLiteConnectionPool(db_path, self.connection_timeout, self.busy_timeout)
+        # Every write goes through a single writer thread
+        self.db_writer = SQLiteWriter(self.db_pool)
+        self.password_hasher = PasswordHasher(
+            n=Config.PASSWORD_SCRYPT_N,
+            max_workers=Config.PASSWORD_HASH_WORKERS,
+            executor=Config.PASSWORD_HASH_EXECUTOR
+        )
+        # Transient database errors are retried here and only here
+        self.db_retry = db_retry_policy
+        # Negative cache of taken usernames/emails; trusted only once warmed
+        self.user_filter = BloomFilter(Config.USER_FILTER_CAPACITY, Config.USER_FILTER_ERROR_RATE)
+        self.user_filter_ready = False
+        self.availability_metrics = {"filter_negatives": 0, "db_checks": 0, "false_positives": 0}
+        self.credential_cache = CredentialCache(Config.CREDENTIAL_CACHE_SIZE, Config.CREDENTIAL_CACHE_TTL)
         # Initialize database
         self._init_db()
-        self.active_sessions = {}  # Store session tokens
+        self._warm_caches(prewarm_credentials=Config.CREDENTIAL_CACHE_PREWARM)
+        # WAL checkpoints, optimize and incremental vacuum in quiet moments
+        self.db_maintenance = SQLiteMaintenance(
+            self.db_pool, self.db_writer,
+            interval=Config.DB_MAINTENANCE_INTERVAL,
+            idle_qps=Config.DB_MAINTENANCE_IDLE_QPS,
+            wal_limit_mb=Config.DB_WAL_LIMIT_MB
+        )
+        # Fallback users waiting to be written to SQLite (survives restarts)
+        self.pending_users = UserWriteBehindQueue(
+            self.db_writer, self.fallback_users, f"{db_path}.pending", f"{db_path}.conflicts.jsonl"
+        )
+        self.token_codec = SignedTokenCodec(Config.SESSION_SECRET)
+        self.revoked_tokens = (
+            TokenRevocationList(self.db_pool, self.db_writer, sync_interval=Config.REVOCATION_SYNC_SECONDS)
+            if Config.TOKEN_REVOCATION else None
+        )
     
     def _get_db_connection(self):
-        """Get a fresh database connection with proper settings"""
+        """Get this thread's pooled database connection (PRAGMAs already applied)"""
+        try:
+            return self.db_pool.acquire()
+        except Exception as e:
+            logger.error(f"Failed to get database connection: {str(e)}")
+            return None
+    
+    def _release_db_connection(self, conn):
+        """Return a connection to the pool instead of closing it"""
+        if conn:
+            self.db_pool.release(conn)
+    
+    def _init_db(self):
+        """Initialize database with multiple retries and index creation"""
+        def create_schema(conn):
+            cursor = conn.cursor()
+            try:
+                # auto_vacuum is stored in the file header; with WAL already on it
+                # only takes effect through VACUUM, which is instant on a new file.
+                # (page_size can't change in WAL mode; SQLite's 4 KB default is kept.)
+                # Existing databases are converted later by SQLiteMaintenance.
+                is_new = cursor.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()[0] == 0
+                if is_new and cursor.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+                    cursor.execute("PRAGMA auto_vacuum=INCREMENTAL")
+                    cursor.execute("VACUUM")
+                
+                # Create users table if it doesn't exist
+                cursor.execute('''
+                    CREATE TABLE IF NOT EXISTS users (
+                        id TEXT PRIMARY KEY,
+                        username TEXT UNIQUE NOT NULL,
+                        password_hash TEXT NOT NULL,
+                        email TEXT UNIQUE NOT NULL,
+                        created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                    )
+                ''')
+                
+                # Create indexes for performance (only creates if they don't exist)
+                try:
+                    cursor.execute('CREATE INDEX IF NOT EXISTS idx_username ON users (username)')
+                    cursor.execute('CREATE INDEX IF NOT EXISTS idx_email ON users (email)')
+                except sqlite3.OperationalError as index_error:
+                    logger.warning(f"Non-critical error creating indexes: {str(index_error)}")
+                
+                # Opaque session tokens are gone; sessions are signed tokens only
+                cursor.execute('DROP TABLE IF EXISTS session_tokens')
+                
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+        
+        try:
+            with retry_deadline(Config.REQUEST_DEADLINE_SECONDS * 2):
+                self.db_retry.run(lambda: self.db_writer.execute(create_schema), "init_db")
+            logger.info("✅ User database initialized successfully")
+        except Exception as e:
+            logger.error(f"Database initialization error: {str(e)}")
+            logger.info("✓ Will use fallback user storage")
+    
+    def _warm_caches(self, prewarm_credentials: bool = False):
+        """Load every username and email into the Bloom filter in one scan,
+        optionally filling the credential cache on the way"""
+        conn = self._get_db_connection()
+        if not conn:
+            logger.warning("User filter not warmed - availability checks will query the database")
+            return
+        try:
+            for user_id, username, email, password_hash in conn.execute(
+                    'SELECT id, username, email, password_hash FROM users'):
+                self.user_filter.add(f"u:{username}")
+                self.user_filter.add(f"e:{email}")
+                if prewarm_credentials and len(self.credential_cache) < self.credential_cache.max_size:
+                    self.credential_cache.put(username, user_id, password_hash)
+            self.user_filter_ready = True
+            logger.info(f"✅ User filter warmed with {self.user_filter.count} keys"
+                        f" ({len(self.credential_cache)} cached credentials)")
+        except Exception as e:
+            logger.warning(f"User filter not warmed - availability checks will query the database: {e}")
+        finally:
+            self._release_db_connection(conn)
+    
+    def _remember_user(self, username: str, email: str):
+        self.user_filter.add(f"u:{username}")
+        self.user_filter.add(f"e:{email}")
+    
+    def check_user_exists(self, username: str, email: str) -> bool:
+        """Check if a username or email already exists without modifying the database"""
+        # First check fallback storage - an O(1) index lookup
+        if self.fallback_users.find_conflict(username, email):
+            logger.info(f"User exists in fallback storage: {username}/{email}")
+            return True
+        
+        # A Bloom filter miss means neither key was ever inserted through this
+        # process. Users added by another worker can slip past it; the UNIQUE
+        # constraints still reject those at insert time.
+        if (self.user_filter_ready
+                and not self.user_filter.might_contain(f"u:{username}")
+                and not self.user_filter.might_contain(f"e:{email}")):
+            self.availability_metrics["filter_negatives"] += 1
+            return False
+        self.availability_metrics["db_checks"] += 1
+        
+        # Then check the database. Reads use this thread's own connection and
+        # run concurrently with other readers and with the writer (WAL), so no
+        # lock is taken.
+        def lookup():
+            conn = self._get_db_connection()
+            if not conn:
+                raise sqlite3.OperationalError("no database connection")
+            try:
+                return conn.execute(
+                    'SELECT username, email FROM users WHERE username = ? OR email = ?', (username, email)
+                ).fetchone()
+            finally:
+                # Always hand the connection back to the pool
+                self._release_db_connection(conn)
+        
         try:
-            # Use a timeout to prevent database locking issues
-            conn = sqlite3.connect(self.db_path, timeout=self.connection_timeout)
-            # Enable WAL mode for better concurrency
-            conn.execute("PRAGMA journal_mode=WAL")
-            # Set a generous busy timeout
-            conn.execute(f"PRAGMA busy_timeout={self.busy_timeout}")
-            # Use the normal synchronization mode for better performance
-            conn.execute("PRAGMA synchronous=NORMAL")
-            # Enable foreign keys
-            conn.execute("PRAGMA foreign_keys=ON")
-            # Set a smaller cache size to reduce memory usage
-            conn.execute("PRAGMA cache_size=2000")
-            # Set a page size of 4KB for better performance
-            conn.execute("PRAGMA page_size=4096")
-            # Enable auto-vacuum to keep the database file small
-            conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
-            # Increase the busy handler timeout
-            conn.execute("PRAGMA busy_timeout=120000")
-            return conn
+            result = self.db_retry.run(lookup, "check_user_exists")
         except Exception as e:
-            logger.error(f"Failed to get database connection: {str(e)}")
-            return None
-    
-    def _init_db(self):
-        """Initialize database with multiple retries and index creation"""
-        retry_count = 0
-        max_init_retries = 5
+            # Assume the user doesn't exist rather than blocking registration;
+            # the UNIQUE constraints still catch a real duplicate
+            logger.error(f"Error checking user existence: {str(e)}")
+            return False
         
-        while retry_count < max_init_retries:
-            with self.db_lock:
-                conn = None
-                try:
-                    # Get a fresh connection
-                    conn = self._get_db_connection()
-                    if not conn:
-                        logger.error(f"Could not initialize database - connection failed (attempt {retry_count+1}/{max_init_retries})")
-                        retry_count += 1
-                        time.sleep(1.0 * retry_count)  # Increase delay with each retry
-                        continue
-                    
-                    cursor = conn.cursor()
-                    
-                    # Create users table if it doesn't exist
-                    cursor.execute('''
-                        CREATE TABLE IF NOT EXISTS users (
-                            id TEXT PRIMARY KEY,
-                            username TEXT UNIQUE NOT NULL,
-                            password_hash TEXT NOT NULL,
-                            email TEXT UNIQUE NOT NULL,
-                            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-                        )
-                    ''')
-                    
-                    # Create indexes for performance (only creates if they don't exist)
-                    try:
-                        cursor.execute('CREATE INDEX IF NOT EXISTS idx_username ON users (username)')
-                        cursor.execute('CREATE INDEX IF NOT EXISTS idx_email ON users (email)')
-                    except sqlite3.OperationalError as index_error:
-                        logger.warning(f"Non-critical error creating indexes: {str(index_error)}")
-                    
-                    conn.commit()
-                    logger.info("✅ User database initialized successfully")
-                    return  # Success - exit the retry loop
-                except sqlite3.OperationalError as e:
-                    if conn:
-                        conn.rollback()
-                    if "database is locked" in str(e) and retry_count < max_init_retries - 1:
-                        logger.warning(f"Database locked during initialization (attempt {retry_count+1}), retrying...")
-                        retry_count += 1
-                        time.sleep(1.5 * retry_count)  # Increasing backoff
-                    else:
-                        logger.error(f"Persistent database error during initialization: {str(e)}")
-                        logger.info("✓ Will use fallback user storage")
-                        return  # Give up after max retries or for other errors
-                except Exception as e:
-                    if conn:
-                        try:
-                            conn.rollback()
-                        except:
-                            pass
-                    logger.error(f"Database initialization error: {str(e)}")
-                    return  # Give up for other errors
-                finally:
-                    # Always close connection if it was opened
-                    if conn:
-                        try:
-                            conn.close()
-                        except Exception as close_error:
-                            logger.error(f"Error closing database connection: {str(close_error)}")
-            
-            # Small delay between retries outside the lock
-            time.sleep(0.5)
+        if result:
+            match_type = []
+            if result[0] == username:
+                match_type.append("username")
+            if result[1] == email:
+                match_type.append("email")
+            logger.info(f"User exists in database: {'/'.join(match_type)}: {username}/{email}")
+            return True
         
-        logger.error(f"Failed to initialize database after {max_init_retries} attempts")
-        logger.info("✓ Will use fallback user storage")
+        if self.user_filter_ready:
+            self.availability_metrics["false_positives"] += 1
+        return False  # User doesn't exist
     
-    def check_user_exists(self, username: str, email: str) -> bool:
-        """Check if a username or email already exists without modifying the database"""
-        # First check fallback storage - this is fast and doesn't need locking
-        for user_id, user_data in self.fallback_users.items():
-            if user_data['username'] == username or user_data['email'] == email:
-                logger.info(f"User exists in fallback storage: {username}/{email}")
-                return True
-        
-        # Then check the database with exponential backoff retry
-        max_retries = self.max_retries
-        retry_count = 0
-        
-        while retry_count < max_retries:
-            with self.db_lock:
-                conn = None
-                try:
-                    # Get a fresh connection
-                    conn = self._get_db_connection()
-                    if not conn:
-                        retry_count += 1
-                        delay = self.base_retry_delay * (2 ** retry_count)  # Exponential backoff
-                        time.sleep(delay)  # Wait before retry
-                        continue
-                    
-                    cursor = conn.cursor()
-                    
-                    # Check username and email separately for better error messages later
-                    cursor.execute('SELECT username, email FROM users WHERE username = ? OR email = ?', (username, email))
-                    result = cursor.fetchone()
-                    
-                    if result:
-                        match_type = []
-                        if result[0] == username:
-                            match_type.append("username")
-                        if result[1] == email:
-                            match_type.append("email")
-                        
-                        logger.info(f"User exists in database: {'/'.join(match_type)}: {username}/{email}")
-                        return True
-                    
-                    return False  # User doesn't exist
-                    
-                except sqlite3.OperationalError as e:
-                    if "database is locked" in str(e) and retry_count < max_retries - 1:
-                        logger.warning(f"Database locked during user check (attempt {retry_count+1}/{max_retries}), retrying...")
-                        retry_count += 1
-                        delay = self.base_retry_delay * (2 ** retry_count)  # Exponential backoff
-                        time.sleep(delay)
-                    else:
-                        logger.error(f"Persistent database error checking user: {str(e)}")
-                        # If we've tried several times and still getting errors, 
-                        # assume user doesn't exist rather than blocking registration
-                        return False
-                except Exception as e:
-                    logger.error(f"Error checking user existence: {str(e)}")
-                    return False
-                finally:
-                    # Always close connection if it was opened
-                    if conn:
-                        try:
-                            conn.close()
-                        except Exception as close_error:
-                            logger.error(f"Error closing database connection: {str(close_error)}")
-        
-        # If we got here, all retries failed
-        logger.error(f"Failed to check if user exists after {max_retries} attempts")
-        # Assume no user exists so we can proceed with registration attempt
-        # The create_user method will have its own duplicates check as a safeguard
-        return False
+    @staticmethod
+    def _validate_new_user(username: str, password: str, email: str) -> Optional[str]:
+        """Return why a registration is invalid, or None"""
+        if not username or not password or not email:
+            return "Username, password, and email are required"
+        if '@' not in email:
+            return "Invalid email format"
+        if len(password) < 6:
+            return "Password must be at least 6 characters"
+        return None
     
     def create_user(self, username: str, password: str, email: str) -> str:
         """Creates a new user and returns the ID with improved error handling and retry logic"""
         # First perform a quick validation of input
-        if not username or not password or not email:
-            raise ValueError("Username, password, and email are required")
-            
-        if '@' not in email:
-            raise ValueError("Invalid email format")
-            
-        if len(password) < 6:
-            raise ValueError("Password must be at least 6 characters")
+        validation_error = self._validate_new_user(username, password, email)
+        if validation_error:
+            raise ValueError(validation_error)
             
         # Check if user exists before attempting creation (with a separate method for retries)
         if self.check_user_exists(username, email):
@@ -397,278 +1932,335 @@ class UserManager:
             
         # Generate user ID and hash password
         user_id = f"user_{uuid.uuid4().hex[:10]}"
-        password_hash = hashlib.sha256(password.encode()).hexdigest()
+        # Hashed on the bounded hasher pool, before any database work
+        password_hash = self.password_hasher.hash(password)
+        
+        def insert_user(conn):
+            """Runs on the writer thread - one attempt, no sleeping"""
+            cursor = conn.cursor()
+            # No duplicate SELECT here: the UNIQUE constraints reject races
+            # and surface as IntegrityError below
+            try:
+                # Insert the new user with explicit transaction
+                cursor.execute("BEGIN IMMEDIATE TRANSACTION")
+                cursor.execute('''
+                    INSERT INTO users (id, username, password_hash, email)
+                    VALUES (?, ?, ?, ?)
+                ''', (user_id, username, password_hash, email))
+                conn.commit()
+            except Exception:
+                conn.rollback()  # Rollback transaction
+                raise
         
-        # Try to create in the database first with exponential backoff retries
-        max_retries = self.max_retries
-        retry_count = 0
+        # Try to create in the database first. Backoff sleeps happen on the
+        # caller's thread, never while holding the writer.
         db_success = False
-        last_error = None
+        try:
+            self.db_retry.run(lambda: self.db_writer.execute(insert_user), "create_user")
+            self._remember_user(username, email)
+            logger.info(f"User created in database: {username} (id: {user_id})")
+            db_success = True
+        except ValueError:
+            raise
+        except sqlite3.IntegrityError as e:
+            error_str = str(e).lower()
+            if "unique" in error_str and "username" in error_str:
+                logger.error(f"Username already exists: {username}")
+                raise ValueError("Username already exists")
+            elif "unique" in error_str and "email" in error_str:
+                logger.error(f"Email already exists: {email}")
+                raise ValueError("Email already exists")
+            else:
+                logger.error(f"Database integrity error on user creation: {str(e)}")
+                raise ValueError("Username or email already exists")
+        except Exception as e:
+            # We'll try fallback storage instead
+            logger.error(f"Error creating user in database: {str(e)}")
         
-        while retry_count < max_retries and not db_success:
-            conn = None
+        # If database creation failed after all retries, use fallback storage
+        if not db_success:
+            logger.warning("Failed to create user in database. Using fallback storage.")
+            
+            # Store in fallback; the duplicate check and insert are atomic
+            # (another thread might have added the same user meanwhile)
             try:
-                with self.db_lock:
-                    # Get a fresh connection
-                    conn = self._get_db_connection()
-                    if not conn:
-                        retry_count += 1
-                        delay = self.base_retry_delay * (2 ** retry_count)  # Exponential backoff
-                        time.sleep(delay)
-                        continue
-                    
-                    # Double-check for duplicates (race condition protection)
-                    cursor = conn.cursor()
-                    cursor.execute('SELECT username, email FROM users WHERE username = ? OR email = ?', (username, email))
-                    result = cursor.fetchone()
-                    if result:
-                        # Check what exactly is duplicated for better error message
-                        duplicates = []
-                        if result[0] == username:
-                            duplicates.append("username")
-                        if result[1] == email:
-                            duplicates.append("email")
-                        
-                        duplicate_text = " and ".join(duplicates)
-                        logger.warning(f"Race condition detected, {duplicate_text} already exists: {username}/{email}")
-                        
-                        if conn:
-                            try:
-                                conn.close()
-                            except:
-                                pass
-                                
-                        raise ValueError(f"The {duplicate_text} already exists")
-                    
-                    try:
-                        # Insert the new user with explicit transaction
-                        cursor.execute("BEGIN IMMEDIATE TRANSACTION")
-                        cursor.execute('''
-                            INSERT INTO users (id, username, password_hash, email)
-                            VALUES (?, ?, ?, ?)
-                        ''', (user_id, username, password_hash, email))
-                        conn.commit()
-                        
-                        logger.info(f"User created in database: {username} (id: {user_id})")
-                        db_success = True
-                    except sqlite3.IntegrityError as e:
-                        conn.rollback()  # Rollback transaction
-                        error_str = str(e).lower()
-                        last_error = e
-                        
-                        if "unique" in error_str and "username" in error_str:
-                            logger.error(f"Username already exists: {username}")
-                            raise ValueError("Username already exists")
-                        elif "unique" in error_str and "email" in error_str:
-                            logger.error(f"Email already exists: {email}")
-                            raise ValueError("Email already exists")
-                        else:
-                            logger.error(f"Database integrity error on user creation: {str(e)}")
-                            raise ValueError("Username or email already exists")
-                    except sqlite3.OperationalError as e:
-                        conn.rollback()  # Rollback transaction
-                        last_error = e
-                        
-                        if "database is locked" in str(e) and retry_count < max_retries - 1:
-                            logger.warning(f"Database locked during user creation (attempt {retry_count+1}), retrying...")
-                            retry_count += 1
-                            delay = self.base_retry_delay * (2 ** retry_count)  # Exponential backoff
-                            time.sleep(delay)
-                        else:
-                            logger.error(f"Persistent database error creating user: {str(e)}")
-                            # We'll try fallback storage after all retries
-                            break
-                    except Exception as e:
-                        conn.rollback()  # Rollback transaction
-                        last_error = e
-                        logger.error(f"Error creating user in database: {str(e)}")
-                        # We'll try fallback storage after retries
-                        break
+                self.fallback_users.add(user_id, username, password_hash, email)
+            except ValueError as e:
+                logger.warning(f"Duplicate in fallback storage: {username}/{email} ({e})")
+                raise
+            self._remember_user(username, email)
+            logger.info(f"User created in fallback storage: {username} (id: {user_id})")
+            
+            # Hand the user to the write-behind worker, which persists it to SQLite
+            # (in a batch with any other fallback users) once the database recovers
+            self.pending_users.enqueue(user_id, self.fallback_users.get(user_id))
+        return user_id
+    
+    # Keeps each "IN (...)" list well under SQLite's 999-variable limit
+    BULK_CHUNK_SIZE = 300
+    
+    def bulk_create_users(self, users: List[dict]) -> List[dict]:
+        """Create many users at once and return one status entry per input row.
+        
+        The whole batch is validated up front (including duplicates within the
+        batch), passwords are hashed in parallel on the hasher pool, and every
+        valid row is inserted with one executemany inside a single
+        BEGIN IMMEDIATE transaction on the writer thread. Statuses are
+        "created", "invalid", "duplicate" or "error".
+        """
+        report = []
+        candidates = []  # (report index, username, password, email)
+        seen_usernames, seen_emails = set(), set()
+        
+        for row, user in enumerate(users):
+            user = user if isinstance(user, dict) else {}
+            username = str(user.get("username") or "").strip()
+            email = str(user.get("email") or "").strip()
+            password = str(user.get("password") or "")
+            entry = {"row": row, "username": username, "email": email}
+            report.append(entry)
+            
+            error = self._validate_new_user(username, password, email)
+            if error:
+                entry.update(status="invalid", error=error)
+                continue
+            duplicate_field = (
+                "username" if username in seen_usernames else
+                "email" if email in seen_emails else
+                self.fallback_users.find_conflict(username, email)
+            )
+            if duplicate_field:
+                entry.update(status="duplicate", error=f"The {duplicate_field} already exists")
+                continue
+            seen_usernames.add(username)
+            seen_emails.add(email)
+            candidates.append((row, username, password, email))
+        
+        # Drop rows that already exist before paying for their hashes.
+        # Only names the Bloom filter might know need a database lookup.
+        maybe_taken = [c for c in candidates if not self.user_filter_ready
+                       or self.user_filter.might_contain(f"u:{c[1]}") or self.user_filter.might_contain(f"e:{c[3]}")]
+        if maybe_taken:
+            taken = set()
+            conn = self._get_db_connection()
+            try:
+                for start in range(0, len(maybe_taken), self.BULK_CHUNK_SIZE):
+                    chunk = maybe_taken[start:start + self.BULK_CHUNK_SIZE]
+                    marks = ",".join("?" * len(chunk))
+                    for row_username, row_email in conn.execute(
+                        f"SELECT username, email FROM users WHERE username IN ({marks}) OR email IN ({marks})",
+                        [c[1] for c in chunk] + [c[3] for c in chunk]
+                    ):
+                        taken.update((("username", row_username), ("email", row_email)))
             except Exception as e:
-                last_error = e
-                logger.error(f"Outer error creating user: {str(e)}")
-                retry_count += 1
-                delay = self.base_retry_delay * (2 ** retry_count)  # Exponential backoff
-                time.sleep(delay)
+                # The transaction below re-checks anyway
+                logger.warning(f"Bulk pre-check skipped: {str(e)}")
             finally:
-                # Always close connection if it was opened
-                if conn:
-                    try:
-                        conn.close()
-                    except Exception as close_error:
-                        logger.error(f"Error closing database connection: {str(close_error)}")
+                self._release_db_connection(conn)
+            remaining = []
+            for candidate in candidates:
+                row, username, _, email = candidate
+                duplicate_field = ("username" if ("username", username) in taken else
+                                   "email" if ("email", email) in taken else None)
+                if duplicate_field:
+                    report[row].update(status="duplicate", error=f"The {duplicate_field} already exists")
+                else:
+                    remaining.append(candidate)
+            candidates = remaining
         
-        # If database creation failed after all retries, use fallback storage
-        if not db_success:
-            logger.warning(f"Failed to create user in database after {retry_count} attempts. Using fallback storage.")
-            
-            # Check again before using fallback (another thread might have added the user)
-            for _, user_data in self.fallback_users.items():
-                if user_data['username'] == username or user_data['email'] == email:
-                    duplicate_field = "username" if user_data['username'] == username else "email"
-                    logger.warning(f"Duplicate {duplicate_field} in fallback storage: {username}/{email}")
-                    raise ValueError(f"The {duplicate_field} already exists")
+        if not candidates:
+            return report
+        
+        # Hash in parallel; the executor caps how many run at once
+        hash_futures = [self.password_hasher.hash_async(password) for _, _, password, _ in candidates]
+        rows = []
+        for (row, username, _, email), future in zip(candidates, hash_futures):
+            rows.append((row, f"user_{uuid.uuid4().hex[:10]}", username, future.result(), email))
+        
+        def insert_all(conn):
+            """Runs on the writer thread: one transaction for the whole batch"""
+            cursor = conn.cursor()
+            try:
+                cursor.execute("BEGIN IMMEDIATE TRANSACTION")
+                # Re-check inside the transaction so rows added meanwhile are reported, not raised
+                taken = set()
+                for start in range(0, len(rows), self.BULK_CHUNK_SIZE):
+                    chunk = rows[start:start + self.BULK_CHUNK_SIZE]
+                    marks = ",".join("?" * len(chunk))
+                    cursor.execute(
+                        f"SELECT username, email FROM users WHERE username IN ({marks}) OR email IN ({marks})",
+                        [r[2] for r in chunk] + [r[4] for r in chunk]
+                    )
+                    for row_username, row_email in cursor.fetchall():
+                        taken.update((("username", row_username), ("email", row_email)))
                 
-            # Store in fallback
-            self.fallback_users[user_id] = {
-                "username": username,
-                "password_hash": password_hash,
-                "email": email,
-                "created_at": datetime.now().isoformat()
-            }
-            logger.info(f"User created in fallback storage after {retry_count} DB attempts: {username} (id: {user_id})")
+                to_insert, conflicts = [], {}
+                for row, user_id, username, password_hash, email in rows:
+                    if ("username", username) in taken:
+                        conflicts[row] = "username"
+                    elif ("email", email) in taken:
+                        conflicts[row] = "email"
+                    else:
+                        to_insert.append((user_id, username, password_hash, email))
+                cursor.executemany(
+                    'INSERT INTO users (id, username, password_hash, email) VALUES (?, ?, ?, ?)', to_insert
+                )
+                conn.commit()
+                return conflicts
+            except Exception:
+                conn.rollback()
+                raise
+        
+        # Hashing a large batch can use up the request's deadline, so the
+        # insert gets its own budget sized to the batch. Once the writer has
+        # started the transaction it is waited for, so the report always
+        # matches what was committed.
+        write_timeout = Config.REQUEST_DEADLINE_SECONDS * (1 + len(rows) // self.BULK_CHUNK_SIZE)
+        future = self.db_writer.submit(insert_all)
+        try:
+            try:
+                conflicts = future.result(write_timeout)
+            except FutureTimeoutError:
+                if not future.cancel():
+                    conflicts = future.result()
+                else:
+                    raise WriterBusyError(f"bulk insert cancelled after {write_timeout:.0f}s in the writer queue")
+        except Exception as e:
+            logger.error(f"Bulk user insert failed, nothing was created: {str(e)}")
+            for row, _, _, _, _ in rows:
+                report[row].update(status="error", error="Database unavailable, retry the batch")
+            return report
+        
+        for row, user_id, username, _, email in rows:
+            if row in conflicts:
+                report[row].update(status="duplicate", error=f"The {conflicts[row]} already exists")
+            else:
+                self._remember_user(username, email)
+                report[row].update(status="created", user_id=user_id)
+        logger.info(f"Bulk provisioning: {len(rows) - len(conflicts)} created, "
+                    f"{len(report) - len(rows) + len(conflicts)} rejected")
+        return report
+    
+    def _verify_fallback(self, username: str, password: str) -> Optional[str]:
+        credentials = self.fallback_users.get_credentials(username)
+        if credentials is None:
+            self.password_hasher.verify_dummy(password)
+            return None
+        if self.password_hasher.verify(password, credentials[1]):
+            return credentials[0]
+        return None
+    
+    def _rehash_password(self, user_id: str, username: str, password: str, old_hash: str):
+        """Upgrade a legacy hash in the background once the login has succeeded"""
+        def store(hash_future):
+            try:
+                new_hash = hash_future.result()
+            except Exception as e:
+                logger.error(f"Password rehash failed for {user_id}: {e}")
+                return
             
-            # Schedule a background task to retry inserting into DB later if needed
-            # This is a basic implementation - in a production system, you might want a proper job queue
-            def delayed_db_insert():
+            def update_hash(conn):
                 try:
-                    time.sleep(10)  # Wait 10 seconds before trying again
-                    with self.db_lock:
-                        conn = self._get_db_connection()
-                        if not conn:
-                            logger.error("Failed to get DB connection for delayed insert")
-                            return
-                        
-                        try:
-                            cursor = conn.cursor()
-                            # Check if user exists first
-                            cursor.execute('SELECT 1 FROM users WHERE id = ? OR username = ? OR email = ?', 
-                                          (user_id, username, email))
-                            if cursor.fetchone():
-                                logger.info(f"User already exists in DB, skipping delayed insert: {username}")
-                                return
-                                
-                            # Insert the user
-                            cursor.execute('''
-                                INSERT INTO users (id, username, password_hash, email)
-                                VALUES (?, ?, ?, ?)
-                            ''', (user_id, username, password_hash, email))
-                            conn.commit()
-                            logger.info(f"Delayed DB insert successful for user: {username}")
-                        except Exception as e:
-                            if conn:
-                                conn.rollback()
-                            logger.error(f"Delayed DB insert failed: {str(e)}")
-                        finally:
-                            if conn:
-                                conn.close()
-                except Exception as outer_e:
-                    logger.error(f"Error in delayed DB insert thread: {str(outer_e)}")
-            
-            # Start background thread for delayed insert
-            threading.Thread(target=delayed_db_insert, daemon=True).start()
-        
-        return user_id
+                    # Only replace the hash we verified against
+                    conn.execute('UPDATE users SET password_hash = ? WHERE id = ? AND password_hash = ?',
+                                 (new_hash, user_id, old_hash))
+                    conn.commit()
+                except Exception:
+                    conn.rollback()
+                    raise
+            def stored(f):
+                if f.exception():
+                    logger.error(f"Could not store rehashed password for {user_id}: {f.exception()}")
+                self.credential_cache.invalidate(username)
+            self.db_writer.submit(update_hash).add_done_callback(stored)
+            self.password_hasher.metrics["rehashed"] += 1
+        self.password_hasher.hash_async(password).add_done_callback(store)
     
     def authenticate_user(self, username: str, password: str) -> Optional[str]:
         """Authenticates user and returns the ID with improved error handling and retry logic"""
         if not username or not password:
             logger.error("Authentication attempt with empty username or password")
             return None
-            
-        password_hash = hashlib.sha256(password.encode()).hexdigest()
         
-        # First check the fallback storage - this is faster and doesn't need locking
-        for user_id, user_data in self.fallback_users.items():
-            if user_data['username'] == username and user_data['password_hash'] == password_hash:
+        # First check the fallback storage - an O(1) index lookup
+        if self.fallback_users.get_credentials(username):
+            user_id = self._verify_fallback(username, password)
+            if user_id:
                 logger.info(f"User authenticated from fallback storage: {username}")
-                return user_id
-        
-        # Then check the database with exponential backoff retries
-        max_retries = self.max_retries
-        retry_count = 0
+            else:
+                logger.warning(f"Failed authentication attempt (wrong password): {username}")
+            return user_id
         
-        while retry_count < max_retries:
-            conn = None
+        # Then fetch the stored hash. Read-only: runs on this thread's
+        # connection, concurrently with other logins.
+        def lookup():
+            conn = self._get_db_connection()
+            if not conn:
+                raise sqlite3.OperationalError("no database connection")
             try:
-                with self.db_lock:
-                    # Get a fresh connection
-                    conn = self._get_db_connection()
-                    if not conn:
-                        retry_count += 1
-                        delay = self.base_retry_delay * (2 ** retry_count)  # Exponential backoff
-                        time.sleep(delay)
-                        continue
-                    
-                    # First check if user exists at all (for better logging)
-                    cursor = conn.cursor()
-                    cursor.execute('SELECT 1 FROM users WHERE username = ?', (username,))
-                    user_exists = cursor.fetchone() is not None
-                    
-                    if not user_exists:
-                        logger.warning(f"Authentication attempted for non-existent user: {username}")
-                        return None
-                    
-                    # Now check credentials
-                    cursor.execute('''
-                        SELECT id FROM users 
-                        WHERE username = ? AND password_hash = ?
-                    ''', (username, password_hash))
-                    user = cursor.fetchone()
-                    
-                    if user:
-                        logger.info(f"User authenticated from database: {username}")
-                        return user[0]
-                    else:
-                        # No need to retry if credentials are invalid
-                        logger.warning(f"Failed authentication attempt (wrong password): {username}")
-                        return None
-            except sqlite3.OperationalError as e:
-                if "database is locked" in str(e) and retry_count < max_retries - 1:
-                    logger.warning(f"Database locked during authentication (attempt {retry_count+1}/{max_retries}), retrying...")
-                    retry_count += 1
-                    delay = self.base_retry_delay * (2 ** retry_count)  # Exponential backoff
-                    time.sleep(delay)
-                else:
-                    logger.error(f"Persistent database error during authentication: {str(e)}")
-                    # If we can't access the database after multiple attempts,
-                    # check again with fallback storage as it might have been updated
-                    for user_id, user_data in self.fallback_users.items():
-                        if user_data['username'] == username and user_data['password_hash'] == password_hash:
-                            logger.info(f"User authenticated from fallback storage (after DB errors): {username}")
-                            return user_id
-                    return None
-            except Exception as e:
-                logger.error(f"Error during authentication: {str(e)}")
-                return None
+                return conn.execute('SELECT id, password_hash FROM users WHERE username = ?', (username,)).fetchone()
             finally:
-                # Always close connection if it was opened
-                if conn:
-                    try:
-                        conn.close()
-                    except Exception as close_error:
-                        logger.error(f"Error closing database connection: {str(close_error)}")
-        
-        # If we got here after retries, authentication failed due to DB issues
-        logger.error(f"Authentication failed after {max_retries} attempts due to database issues")
-        
-        # One last check with fallback storage before giving up
-        for user_id, user_data in self.fallback_users.items():
-            if user_data['username'] == username and user_data['password_hash'] == password_hash:
-                logger.info(f"User authenticated from fallback storage (final attempt): {username}")
-                return user_id
-                
-        return None
+                # Always hand the connection back to the pool
+                self._release_db_connection(conn)
+        
+        try:
+            row = self.credential_cache.get(username)
+            if row is None:
+                row = self.db_retry.run(lookup, "authenticate_user")
+                if row:
+                    self.credential_cache.put(username, row[0], row[1])
+        except sqlite3.OperationalError as e:
+            logger.error(f"Persistent database error during authentication: {str(e)}")
+            # The fallback storage might have been updated meanwhile
+            user_id = self._verify_fallback(username, password)
+            if user_id:
+                logger.info(f"User authenticated from fallback storage (after DB errors): {username}")
+            return user_id
+        except Exception as e:
+            logger.error(f"Error during authentication: {str(e)}")
+            return None
+        
+        if not row:
+            logger.warning(f"Authentication attempted for non-existent user: {username}")
+            # Same scrypt cost as a wrong password, so timing doesn't reveal the username is free
+            self.password_hasher.verify_dummy(password)
+            return None
+        
+        # The KDF runs on the hasher pool with no connection held
+        user_id, stored_hash = row
+        if not self.password_hasher.verify(password, stored_hash):
+            logger.warning(f"Failed authentication attempt (wrong password): {username}")
+            return None
+        if self.password_hasher.needs_rehash(stored_hash):
+            self._rehash_password(user_id, username, password, stored_hash)
+        logger.info(f"User authenticated from database: {username}")
+        return user_id
     
-    def store_session_token(self, user_id: str, token: str):
-        """Store a session token for the user"""
-        self.active_sessions[token] = {
-            "user_id": user_id,
-            "created_at": datetime.now()
-        }
+    def issue_session_token(self, user_id: str) -> str:
+        """Create a signed session token that any worker can verify"""
+        return self.token_codec.encode(user_id, Config.SESSION_TTL_HOURS * 3600)
     
     def get_user_by_token(self, token: str) -> Optional[str]:
-        """Get user_id from token"""
-        session = self.active_sessions.get(token)
-        if not session:
+        """Get user_id from token (None if unknown, expired or revoked)"""
+        # Only signed tokens are ever issued; anything else is rejected without a lookup
+        if not self.token_codec.is_signed(token):
             return None
-            
-        # Check if token is expired (24 hours)
-        if datetime.now() - session["created_at"] > timedelta(hours=24):
-            del self.active_sessions[token]
+        payload = self.token_codec.decode(token)
+        if not payload:
             return None
-            
-        return session["user_id"]
+        if self.revoked_tokens and self.revoked_tokens.is_revoked(payload["jti"]):
+            return None
+        return payload["uid"]
+    
+    def revoke_session_token(self, token: str) -> bool:
+        """Invalidate a token before it expires"""
+        if not self.token_codec.is_signed(token):
+            return False
+        payload = self.token_codec.decode(token)
+        if not payload or not self.revoked_tokens:
+            return False
+        self.revoked_tokens.revoke(payload["jti"], payload["exp"])
+        return True
 
 # Initialize user manager
 user_manager = UserManager()
@@ -710,6 +2302,7 @@ def login_required(f):
                 
             # Add user_id to request
             request.user_id = user_id
+            request.auth_token = token
             logger.debug(f"Authenticated request for user: {user_id}")
             
             # Add CORS headers to authenticated response
@@ -724,20 +2317,710 @@ def login_required(f):
             }), 500
     return decorated_function
 
+def admin_required(f):
+    """Allow the request only with a matching X-Admin-Key header"""
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if not Config.ADMIN_API_KEY:
+            return jsonify({"error": "Admin API is disabled", "detail": "Set ADMIN_API_KEY to enable it"}), 404
+        provided = request.headers.get('X-Admin-Key', '')
+        if not hmac.compare_digest(provided.encode(), Config.ADMIN_API_KEY.encode()):
+            logger.warning(f"Rejected admin request from {request.remote_addr or 'unknown'}")
+            return jsonify({"error": "Invalid admin key"}), 403
+        return f(*args, **kwargs)
+    return decorated_function
+
 # ========================
 # CORE CLASSES
 # ========================
+def load_encryption_key() -> str:
+    """The profile master key: Config.ENCRYPTION_KEY, or one generated on first use and kept on disk.
+
+    A per-process key would make every saved profile unreadable after a
+    restart, so the generated key is written once (O_EXCL, so concurrent
+    workers agree on it) and read back by every later process.
+    """
+    if Config.ENCRYPTION_KEY:
+        return Config.ENCRYPTION_KEY
+    key_file = Config.ENCRYPTION_KEY_FILE
+    try:
+        with open(key_file, "r") as f:
+            return f.read().strip()
+    except FileNotFoundError:
+        pass
+    os.makedirs(os.path.dirname(key_file) or ".", exist_ok=True)
+    key = Fernet.generate_key().decode()
+    try:
+        fd = os.open(key_file, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    except FileExistsError:
+        # Another worker won the race
+        with open(key_file, "r") as f:
+            return f.read().strip()
+    with os.fdopen(fd, "w") as f:
+        f.write(key)
+    logger.warning(f"⚠️ ENCRYPTION_KEY not set - generated one in {key_file}; back it up with the profiles")
+    return key
+
+
+class MoodSeries:
+    """Columnar, append-only mood history.
+
+    One entry costs 8 bytes of timestamp (epoch seconds), 1 byte of score,
+    8 bytes of running sum and 2 bytes per emotion, with emotion names
+    interned per series - instead of a dict holding an ISO string, a list and
+    boxed ints. Timestamps are kept sorted, so a time window is found with
+    bisect and its sum read off the prefix sums: O(log n) per query.
+    """
+    def __init__(self):
+        self.timestamps = array("q")        # epoch seconds, non-decreasing
+        self.scores = array("b")            # int8 mood scores
+        self.prefix_sums = array("q", [0])  # prefix_sums[i] = sum(scores[:i])
+        self.emotion_codes = array("H")     # every entry's emotions, concatenated
+        self.emotion_offsets = array("I", [0])  # entry i owns codes[offsets[i]:offsets[i + 1]]
+        self.emotion_names = []             # code -> name
+        self._emotion_index = {}            # name -> code
+        self.notes = {}                     # entry index -> notes, only when non-empty
+    
+    @classmethod
+    def from_entries(cls, entries: List[dict]) -> "MoodSeries":
+        series = cls()
+        for entry in entries:
+            series.append(datetime.fromisoformat(entry["timestamp"]).timestamp(), entry["mood_score"],
+                          entry.get("emotions") or [], entry.get("notes") or "")
+        return series
+    
+    def __len__(self):
+        return len(self.scores)
+    
+    def _intern(self, emotion: str) -> int:
+        code = self._emotion_index.get(emotion)
+        if code is None:
+            code = len(self.emotion_names)
+            self.emotion_names.append(emotion)
+            self._emotion_index[emotion] = code
+        return code
+    
+    def append(self, timestamp: float, score: int, emotions: List[str], notes: str = ""):
+        # A clock stepping backwards must not break the sort order bisect relies on
+        timestamp = int(timestamp)
+        if self.timestamps and timestamp < self.timestamps[-1]:
+            timestamp = self.timestamps[-1]
+        self.timestamps.append(timestamp)
+        self.scores.append(int(score))
+        self.prefix_sums.append(self.prefix_sums[-1] + int(score))
+        self.emotion_codes.extend(self._intern(str(e)) for e in emotions)
+        self.emotion_offsets.append(len(self.emotion_codes))
+        if notes:
+            self.notes[len(self.scores) - 1] = notes
+    
+    @property
+    def total(self) -> int:
+        return self.prefix_sums[-1]
+    
+    @property
+    def average(self) -> Optional[float]:
+        return self.total / len(self) if len(self) else None
+    
+    def index_since(self, timestamp: float) -> int:
+        """Index of the first entry at or after `timestamp`"""
+        return bisect.bisect_left(self.timestamps, int(math.ceil(timestamp)))
+    
+    def window_sum(self, start: int, stop: Optional[int] = None) -> int:
+        return self.prefix_sums[len(self) if stop is None else stop] - self.prefix_sums[start]
+    
+    def entry(self, index: int) -> dict:
+        start, stop = self.emotion_offsets[index], self.emotion_offsets[index + 1]
+        return {
+            "timestamp": datetime.fromtimestamp(self.timestamps[index]).isoformat(),
+            "mood_score": self.scores[index],
+            "emotions": [self.emotion_names[code] for code in self.emotion_codes[start:stop]],
+            "notes": self.notes.get(index, "")
+        }
+    
+    def to_entries(self, stop: Optional[int] = None) -> List[dict]:
+        return [self.entry(i) for i in range(len(self) if stop is None else stop)]
+    
+    def nbytes(self) -> int:
+        """Approximate memory held by the columns (excluding names and notes)"""
+        columns = (self.timestamps, self.scores, self.prefix_sums, self.emotion_codes, self.emotion_offsets)
+        return sum(column.buffer_info()[1] * column.itemsize for column in columns)
+
+
+def mood_series_analytics(series: MoodSeries, windows=(7, 30, 90), now: Optional[datetime] = None) -> dict:
+    """Averages, slopes, volatility and emotion frequencies for several windows at once.
+
+    Windows are the last N calendar days, as in get_mood_trends, found by
+    bisect. They are nested suffixes of the sorted series, so only the widest
+    window is ever copied; each window then costs one Gram product and one
+    column sum over a view of it - a fixed handful of NumPy calls, which is
+    what dominates on the short windows a typical user has. Slopes are
+    least-squares fits in mood points per day.
+    """
+    now = now or datetime.now()
+    windows = sorted({int(days) for days in windows if int(days) > 0})
+    midnight = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    starts = [series.index_since((midnight - timedelta(days=days - 1)).timestamp()) for days in windows]
+    base = min(starts, default=len(series))
+    
+    # Row 0: days relative to now, row 1: scores
+    xy = np.empty((2, len(series) - base))
+    np.subtract(np.frombuffer(series.timestamps, dtype=np.int64)[base:], now.timestamp(), out=xy[0])
+    xy[0] /= 86400.0
+    xy[1] = np.frombuffer(series.scores, dtype=np.int8)[base:]
+    offsets = np.frombuffer(series.emotion_offsets, dtype=np.uint32)
+    codes = np.frombuffer(series.emotion_codes, dtype=np.uint16)
+    names = series.emotion_names
+    
+    results = {}
+    for days, start in zip(windows, starts):
+        count = len(series) - start
+        if not count:
+            results[f"{days}d"] = {"entries": 0, "average": None, "slope_per_day": None,
+                                   "volatility": None, "emotions": {}}
+            continue
+        window = xy[:, start - base:]
+        (sxx, sxy), (_, syy) = (window @ window.T).tolist()
+        sx, sy = window.sum(axis=1).tolist()
+        mean = sy / count
+        # n^2 * variance of x; ~0 when every entry falls at the same moment
+        spread = count * sxx - sx * sx
+        slope = (count * sxy - sx * sy) / spread if spread > 1e-12 * count * count else None
+        emotion_counts = np.bincount(codes[offsets[start]:], minlength=len(names)).tolist()
+        emotions = {names[code]: round(emotion_counts[code] / count, 3)
+                    for code in sorted(range(len(names)), key=emotion_counts.__getitem__, reverse=True)
+                    if emotion_counts[code]}
+        results[f"{days}d"] = {
+            "entries": count,
+            "average": round(mean, 2),
+            "slope_per_day": round(slope, 4) if slope is not None else None,
+            "volatility": round(math.sqrt(max(syy / count - mean * mean, 0.0)), 2),
+            "emotions": emotions
+        }
+    return {"entries": len(series), "generated_at": now.isoformat(), "windows": results}
+
+
+class ProfileStoreConflict(Exception):
+    """New mood records can't be placed until the snapshot is rewritten (e.g. a legacy snapshot)"""
+
+
+class FileProfileStore:
+    """One directory per user: profile.enc (snapshot), mood.log and data.key.
+
+    profile.enc starts with a plaintext header giving how many mood entries
+    the snapshot holds, and each mood.log line is "<seq> <encrypted record>".
+    Every change happens under an exclusive flock on the user's .lock file
+    (reads take it shared), so worker processes can share the directory:
+    seq numbers are assigned here rather than from a worker's cached copy,
+    and a snapshot rewrite re-reads what is on disk before replacing it.
+    """
+    name = "files"
+    SNAPSHOT_HEADER = b"MMP1 "
+    
+    def __init__(self, root: str):
+        self.root = root
+    
+    def _paths(self, user_id: str) -> Tuple[str, str]:
+        data_dir = f"{self.root}/{user_id}"
+        return f"{data_dir}/profile.enc", f"{data_dir}/mood.log"
+    
+    @contextmanager
+    def _locked(self, user_id: str, exclusive: bool):
+        data_dir = f"{self.root}/{user_id}"
+        if exclusive:
+            os.makedirs(data_dir, exist_ok=True)
+        try:
+            fd = os.open(f"{data_dir}/.lock", os.O_RDWR | os.O_CREAT, 0o600)
+        except FileNotFoundError:
+            # Nothing stored for this user yet, so nothing to guard
+            yield
+            return
+        try:
+            if fcntl is not None:
+                fcntl.flock(fd, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            yield
+        finally:
+            os.close(fd)  # releases the flock
+    
+    def read_data_key(self, user_id: str) -> Optional[bytes]:
+        try:
+            with open(f"{self.root}/{user_id}/data.key", "rb") as f:
+                return f.read().strip()
+        except FileNotFoundError:
+            return None
+    
+    def create_data_key(self, user_id: str, wrapped_key: bytes) -> bytes:
+        """Store a wrapped data key unless one exists; return whichever is stored"""
+        key_path = f"{self.root}/{user_id}/data.key"
+        os.makedirs(os.path.dirname(key_path), exist_ok=True)
+        try:
+            fd = os.open(key_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        except FileExistsError:
+            return self.read_data_key(user_id)
+        with os.fdopen(fd, "wb") as f:
+            f.write(wrapped_key)
+            f.flush()
+            os.fsync(f.fileno())
+        return wrapped_key
+    
+    def _version_unlocked(self, user_id: str) -> tuple:
+        version = []
+        for path in self._paths(user_id):
+            try:
+                st = os.stat(path)
+                version.append((st.st_ino, st.st_size, st.st_mtime_ns))
+            except FileNotFoundError:
+                version.append(None)
+        return tuple(version)
+    
+    def _snapshot_entries(self, profile_path: str) -> Optional[int]:
+        """Mood entries in the snapshot per its header; 0 without a snapshot, None for a legacy one"""
+        try:
+            with open(profile_path, "rb") as f:
+                head = f.read(32)
+        except FileNotFoundError:
+            return 0
+        if not head.startswith(self.SNAPSHOT_HEADER):
+            return None
+        return int(head[len(self.SNAPSHOT_HEADER):head.index(b"\n")])
+    
+    @staticmethod
+    def _parse_record(line: bytes) -> Tuple[Optional[int], bytes]:
+        seq, _, blob = line.partition(b" ")
+        if blob and seq.isdigit():
+            return int(seq), blob
+        return None, line  # written before seq numbers were assigned here
+    
+    def _last_seq(self, mood_log_path: str) -> Optional[int]:
+        """seq of the log's last record, reading backwards from the end"""
+        try:
+            with open(mood_log_path, "rb") as f:
+                end = f.seek(0, os.SEEK_END)
+                tail, position = b"", end
+                while position > 0:
+                    step = min(4096, position)
+                    position -= step
+                    f.seek(position)
+                    tail = f.read(step) + tail
+                    lines = [line for line in tail.split(b"\n") if line.strip()]
+                    if len(lines) > 1 or (lines and position == 0):
+                        seq, _ = self._parse_record(lines[-1])
+                        if seq is None:
+                            raise ProfileStoreConflict("mood log predates store-assigned seq numbers")
+                        return seq
+        except FileNotFoundError:
+            pass
+        return None
+    
+    def _read_unlocked(self, user_id: str) -> Tuple[Optional[bytes], Optional[int], List[Tuple[Optional[int], bytes]]]:
+        profile_path, mood_log_path = self._paths(user_id)
+        snapshot, mood_entries = None, 0
+        try:
+            with open(profile_path, "rb") as f:
+                snapshot = f.read()
+            if snapshot.startswith(self.SNAPSHOT_HEADER):
+                header, _, snapshot = snapshot.partition(b"\n")
+                mood_entries = int(header[len(self.SNAPSHOT_HEADER):])
+            else:
+                mood_entries = None
+        except FileNotFoundError:
+            pass
+        try:
+            with open(mood_log_path, "rb") as f:
+                records = [self._parse_record(line) for line in f.read().splitlines() if line.strip()]
+        except FileNotFoundError:
+            records = []
+        return snapshot, mood_entries, records
+    
+    def read(self, user_id: str):
+        """(snapshot or None, its mood entry count (None if unknown), [(seq, record)], version)"""
+        with self._locked(user_id, exclusive=False):
+            return (*self._read_unlocked(user_id), self._version_unlocked(user_id))
+    
+    def version(self, user_id: str) -> tuple:
+        """Changes whenever another process writes this user's profile"""
+        return self._version_unlocked(user_id)
+    
+    def append_mood_records(self, user_id: str, records: List[Tuple[float, bytes]]) -> Tuple[tuple, tuple]:
+        """Append records with the next free seq numbers; returns the version before and after"""
+        profile_path, mood_log_path = self._paths(user_id)
+        with self._locked(user_id, exclusive=True):
+            before = self._version_unlocked(user_id)
+            snapshot_entries = self._snapshot_entries(profile_path)
+            if snapshot_entries is None:
+                raise ProfileStoreConflict("snapshot has no entry count header")
+            last_seq = self._last_seq(mood_log_path)
+            # A crash between a snapshot and its log truncation leaves records the snapshot already holds
+            base = max(snapshot_entries, last_seq + 1 if last_seq is not None else 0)
+            with open(mood_log_path, "ab") as f:
+                f.write(b"".join(b"%d %s\n" % (base + i, blob) for i, (_, blob) in enumerate(records)))
+            return before, self._version_unlocked(user_id)
+    
+    def rewrite(self, user_id: str, merge) -> tuple:
+        """Replace the snapshot with `merge(snapshot, mood_entries, records)` -> (snapshot, mood_entries).
+
+        `merge` sees the current snapshot and log under the exclusive lock, so
+        nothing another process wrote is overwritten. Returns the new version.
+        """
+        profile_path, mood_log_path = self._paths(user_id)
+        with self._locked(user_id, exclusive=True):
+            snapshot, mood_entries = merge(*self._read_unlocked(user_id))
+            # Replace atomically so a crash never leaves a half-written snapshot
+            tmp_path = f"{profile_path}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(b"%s%d\n" % (self.SNAPSHOT_HEADER, mood_entries))
+                f.write(snapshot)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, profile_path)
+            # A crash before this only leaves records that replay skips by seq
+            if os.path.exists(mood_log_path):
+                open(mood_log_path, "wb").close()
+            return self._version_unlocked(user_id)
+    
+    def quarantine(self, user_id: str) -> str:
+        """Move an unreadable snapshot aside so it is kept but no longer loaded"""
+        profile_path, _ = self._paths(user_id)
+        unreadable = f"{profile_path}.unreadable-{int(time.time())}"
+        with self._locked(user_id, exclusive=True):
+            os.replace(profile_path, unreadable)
+        return unreadable
+    
+    def close(self):
+        pass
+    
+    def stats(self) -> dict:
+        return {"backend": self.name, "root": self.root}
+
+
+class SQLiteProfileStore:
+    """Every user's profile in one WAL-mode SQLite database.
+
+    `profiles` holds one encrypted snapshot per user, `profile_moods` the
+    encrypted mood records written since, keyed by (user_id, seq) and indexed
+    by timestamp, and `profile_keys` each user's wrapped data key. Loading a profile is one indexed query; backing up every
+    profile is one file. Reads use pooled per-thread connections and writes
+    go through a single writer thread, like users.db.
+
+    seq numbers are assigned inside the insert transaction and snapshots are
+    rewritten from what the database holds, so worker processes sharing the
+    file never overwrite each other's mood entries or profile updates.
+    """
+    name = "sqlite"
+    
+    def __init__(self, db_path: str, busy_timeout_ms: int = 1000):
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self.pool = SQLiteConnectionPool(db_path, busy_timeout_ms / 1000, busy_timeout_ms)
+        self.writer = SQLiteWriter(self.pool, name="profile-store-writer")
+        self.maintenance = SQLiteMaintenance(
+            self.pool, self.writer,
+            interval=Config.DB_MAINTENANCE_INTERVAL,
+            idle_qps=Config.DB_MAINTENANCE_IDLE_QPS,
+            wal_limit_mb=Config.DB_WAL_LIMIT_MB
+        )
+        self.metrics = {"loads": 0, "mood_appends": 0, "snapshots": 0}
+        self._init_db()
+    
+    def _init_db(self):
+        def create_schema(conn):
+            try:
+                is_new = conn.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()[0] == 0
+                if is_new and conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+                    conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+                    conn.execute("VACUUM")
+                conn.execute('''
+                    CREATE TABLE IF NOT EXISTS profiles (
+                        user_id TEXT PRIMARY KEY,
+                        snapshot BLOB NOT NULL,
+                        mood_entries INTEGER NOT NULL,
+                        updated_at REAL NOT NULL,
+                        version INTEGER NOT NULL DEFAULT 0
+                    ) WITHOUT ROWID
+                ''')
+                columns = {row[1] for row in conn.execute("PRAGMA table_info(profiles)")}
+                if "version" not in columns:
+                    conn.execute("ALTER TABLE profiles ADD COLUMN version INTEGER NOT NULL DEFAULT 0")
+                conn.execute('''
+                    CREATE TABLE IF NOT EXISTS profile_moods (
+                        user_id TEXT NOT NULL,
+                        seq INTEGER NOT NULL,
+                        timestamp REAL NOT NULL,
+                        record BLOB NOT NULL,
+                        PRIMARY KEY (user_id, seq)
+                    ) WITHOUT ROWID
+                ''')
+                conn.execute("CREATE INDEX IF NOT EXISTS idx_profile_moods_time ON profile_moods (user_id, timestamp)")
+                conn.execute('''
+                    CREATE TABLE IF NOT EXISTS profile_keys (
+                        user_id TEXT PRIMARY KEY,
+                        wrapped_key BLOB NOT NULL,
+                        created_at REAL NOT NULL
+                    ) WITHOUT ROWID
+                ''')
+                conn.execute('''
+                    CREATE TABLE IF NOT EXISTS profiles_unreadable (
+                        user_id TEXT NOT NULL,
+                        snapshot BLOB NOT NULL,
+                        moved_at REAL NOT NULL
+                    )
+                ''')
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+        with retry_deadline(Config.REQUEST_DEADLINE_SECONDS * 2):
+            db_retry_policy.run(lambda: self.writer.execute(create_schema), "init_profile_db")
+        logger.info(f"✅ Profile database ready at {self.db_path}")
+    
+    def _version(self, conn, user_id: str) -> tuple:
+        return conn.execute('''
+            SELECT (SELECT version FROM profiles WHERE user_id = ?),
+                   (SELECT MAX(seq) FROM profile_moods WHERE user_id = ?)
+        ''', (user_id, user_id)).fetchone()
+    
+    def _read(self, conn, user_id: str):
+        # Snapshot (seq -1) and log records in one indexed statement
+        rows = conn.execute('''
+            SELECT -1, snapshot, mood_entries, version FROM profiles WHERE user_id = ?
+            UNION ALL
+            SELECT seq, record, NULL, NULL FROM profile_moods WHERE user_id = ?
+            ORDER BY 1
+        ''', (user_id, user_id)).fetchall()
+        snapshot, mood_entries, version = None, 0, None
+        if rows and rows[0][0] == -1:
+            _, snapshot, mood_entries, version = rows.pop(0)
+        records = [(seq, blob) for seq, blob, _, _ in rows]
+        return snapshot, mood_entries, records, (version, records[-1][0] if records else None)
+    
+    def read(self, user_id: str):
+        """(snapshot or None, its mood entry count, [(seq, record)], version)"""
+        def query():
+            conn = self.pool.acquire()
+            try:
+                return self._read(conn, user_id)
+            finally:
+                self.pool.release(conn)
+        result = db_retry_policy.run(query, "load_profile")
+        self.metrics["loads"] += 1
+        return result
+    
+    def version(self, user_id: str) -> tuple:
+        """Changes whenever any process writes this user's profile"""
+        def query():
+            conn = self.pool.acquire()
+            try:
+                return self._version(conn, user_id)
+            finally:
+                self.pool.release(conn)
+        return db_retry_policy.run(query, "profile_version")
+    
+    def read_data_key(self, user_id: str) -> Optional[bytes]:
+        def query():
+            conn = self.pool.acquire()
+            try:
+                return conn.execute("SELECT wrapped_key FROM profile_keys WHERE user_id = ?", (user_id,)).fetchone()
+            finally:
+                self.pool.release(conn)
+        row = db_retry_policy.run(query, "read_data_key")
+        return row[0] if row else None
+    
+    def create_data_key(self, user_id: str, wrapped_key: bytes) -> bytes:
+        """Store a wrapped data key unless one exists; return whichever is stored"""
+        def insert(conn):
+            try:
+                conn.execute(
+                    "INSERT OR IGNORE INTO profile_keys (user_id, wrapped_key, created_at) VALUES (?, ?, ?)",
+                    (user_id, wrapped_key, time.time())
+                )
+                conn.commit()
+                return conn.execute("SELECT wrapped_key FROM profile_keys WHERE user_id = ?", (user_id,)).fetchone()[0]
+            except Exception:
+                conn.rollback()
+                raise
+        return db_retry_policy.run(lambda: self.writer.execute(insert), "create_data_key")
+    
+    def append_mood_records(self, user_id: str, records: List[Tuple[float, bytes]]) -> Tuple[tuple, tuple]:
+        """Insert records with the next free seq numbers; returns the version before and after"""
+        def insert(conn):
+            try:
+                conn.execute("BEGIN IMMEDIATE TRANSACTION")
+                before = self._version(conn, user_id)
+                row = conn.execute("SELECT mood_entries FROM profiles WHERE user_id = ?", (user_id,)).fetchone()
+                base = max(row[0] if row else 0, before[1] + 1 if before[1] is not None else 0)
+                conn.executemany(
+                    "INSERT INTO profile_moods (user_id, seq, timestamp, record) VALUES (?, ?, ?, ?)",
+                    [(user_id, base + i, timestamp, blob) for i, (timestamp, blob) in enumerate(records)]
+                )
+                after = self._version(conn, user_id)
+                conn.commit()
+                return before, after
+            except Exception:
+                conn.rollback()
+                raise
+        versions = db_retry_policy.run(lambda: self.writer.execute(insert), "append_moods")
+        self.metrics["mood_appends"] += len(records)
+        return versions
+    
+    def rewrite(self, user_id: str, merge) -> tuple:
+        """Replace the snapshot with `merge(snapshot, mood_entries, records)` -> (snapshot, mood_entries).
+
+        `merge` runs on the writer thread inside the transaction, so it sees
+        every committed change and nothing is written in between. The records
+        are folded into the snapshot and dropped. Returns the new version.
+        """
+        def replace(conn):
+            try:
+                conn.execute("BEGIN IMMEDIATE TRANSACTION")
+                snapshot, mood_entries, records, (version, _) = self._read(conn, user_id)
+                snapshot, mood_entries = merge(snapshot, mood_entries, records)
+                conn.execute(
+                    "INSERT OR REPLACE INTO profiles (user_id, snapshot, mood_entries, updated_at, version) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (user_id, snapshot, mood_entries, time.time(), (version or 0) + 1)
+                )
+                conn.execute("DELETE FROM profile_moods WHERE user_id = ?", (user_id,))
+                new_version = self._version(conn, user_id)
+                conn.commit()
+                return new_version
+            except Exception:
+                conn.rollback()
+                raise
+        version = db_retry_policy.run(lambda: self.writer.execute(replace), "write_profile")
+        self.metrics["snapshots"] += 1
+        return version
+    
+    def quarantine(self, user_id: str) -> str:
+        def move(conn):
+            try:
+                conn.execute("BEGIN IMMEDIATE TRANSACTION")
+                conn.execute(
+                    "INSERT INTO profiles_unreadable (user_id, snapshot, moved_at) "
+                    "SELECT user_id, snapshot, ? FROM profiles WHERE user_id = ?", (time.time(), user_id)
+                )
+                conn.execute("DELETE FROM profiles WHERE user_id = ?", (user_id,))
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+        self.writer.execute(move)
+        return f"{self.db_path}:profiles_unreadable"
+    
+    def backup(self, dest_path: str):
+        """Consistent copy of every profile into a single file, taken while the store stays online"""
+        def copy_to(conn):
+            dest = sqlite3.connect(dest_path)
+            try:
+                conn.backup(dest)
+            finally:
+                dest.close()
+        self.writer.execute(copy_to)
+    
+    def close(self):
+        self.maintenance.stop()
+        self.writer.stop()
+        self.pool.close_all()
+    
+    def stats(self) -> dict:
+        return {"backend": self.name, **self.metrics, "pool": self.pool.stats(), "writer": self.writer.stats()}
+
+
+def create_profile_store():
+    """The profile backend selected by Config.PROFILE_STORE"""
+    if Config.PROFILE_STORE == "sqlite":
+        return SQLiteProfileStore(Config.PROFILE_DB_PATH, Config.SQLITE_BUSY_TIMEOUT_MS)
+    return FileProfileStore(Config.USER_DATA_DIR)
+
+
+class ProfileKeyring:
+    """Envelope encryption for profiles, with unwrapped ciphers cached.
+
+    Each user's data is encrypted with its own data key. The data key is
+    stored next to the profile wrapped (Fernet-encrypted) by the master key,
+    so the master key never touches profile data and a lost profile store
+    leaks nothing without it. Unwrapping costs a Fernet decryption, so the
+    resulting ciphers are kept in a bounded LRU.
+
+    Each cipher also decrypts with the master key, so profiles written
+    before per-user keys existed stay readable and are re-encrypted with the
+    data key on their next save. A data key is only created for a user's
+    first write; reading a user who has none needs at most the master key.
+    """
+    def __init__(self, master_key: str, store, max_cached: int = 10000):
+        self.master = Fernet(master_key)
+        self.store = store
+        self.max_cached = max_cached
+        self._ciphers = OrderedDict()  # user_id -> MultiFernet
+        self._lock = threading.Lock()
+        # Decrypts what was written before per-user keys existed
+        self.master_cipher = MultiFernet([self.master])
+        self.metrics = {"hits": 0, "unwrapped": 0, "created": 0, "evictions": 0}
+    
+    def cipher_for(self, user_id: str, create: bool = True) -> Optional[MultiFernet]:
+        """The user's data-key cipher; without `create`, None if the user has no data key yet"""
+        with self._lock:
+            cipher = self._ciphers.get(user_id)
+            if cipher is not None:
+                self._ciphers.move_to_end(user_id)
+                self.metrics["hits"] += 1
+                return cipher
+        
+        wrapped = self.store.read_data_key(user_id)
+        if wrapped is None:
+            if not create:
+                return None
+            # Another worker may create one at the same time; the store keeps the first
+            wrapped = self.store.create_data_key(user_id, self.master.encrypt(Fernet.generate_key()))
+            self.metrics["created"] += 1
+        try:
+            data_key = self.master.decrypt(wrapped)
+        except InvalidToken:
+            # Only the master key that wrapped it can recover this user's data,
+            # so don't replace it with a fresh one
+            raise ValueError(f"Data key for {user_id} was wrapped by a different master key")
+        cipher = MultiFernet([Fernet(data_key), self.master])
+        
+        with self._lock:
+            self.metrics["unwrapped"] += 1
+            self._ciphers[user_id] = cipher
+            while len(self._ciphers) > self.max_cached:
+                self._ciphers.popitem(last=False)
+                self.metrics["evictions"] += 1
+        return cipher
+    
+    def stats(self) -> dict:
+        return {**self.metrics, "cached": len(self._ciphers), "max_cached": self.max_cached}
+
+
 class UserProfile:
     """Comprehensive user profile with therapy-focused data structure"""
-    def __init__(self, user_id: str):
+    def __init__(self, user_id: str, keyring: Optional[ProfileKeyring] = None,
+                 writer: Optional["ProfileWriteBehind"] = None, store=None):
         self.user_id = user_id
-        self.data_dir = f"{Config.USER_DATA_DIR}/{user_id}"
-        os.makedirs(self.data_dir, exist_ok=True)
+        # FileProfileStore or SQLiteProfileStore
+        self.store = store or FileProfileStore(Config.USER_DATA_DIR)
         
-        # Initialize encryption
+        # Normally the registry's shared ProfileKeyring; the data-key cipher
+        # is looked up on load and the key only created on the first write
         if Config.ENABLE_ENCRYPTION:
-            self.encryption_key = Fernet.generate_key()
-            self.cipher = Fernet(self.encryption_key)
+            self.keyring = keyring or ProfileKeyring(load_encryption_key(), self.store, 1)
+        self.cipher = None
+        # Guards in-memory state; disk writes happen in flush(), under _flush_lock
+        self._write_lock = threading.RLock()
+        self._flush_lock = threading.Lock()
+        self._mood_log_entries = 0
+        # Changes not yet stored, in order: ("update", dict) or ("mood", entry).
+        # Kept as operations so a snapshot rewrite can replay them onto what
+        # other worker processes stored meanwhile
+        self._pending_ops = []
+        # Store version this copy reflects; the registry reloads it once another process writes
+        self.store_version = None
+        # Stored in a format that can't take appends; the next flush rewrites the snapshot
+        self._needs_rewrite = False
+        # Without a writer every change is flushed on the calling thread
+        self.writer = writer
+        # Mood entries live here rather than in self.profile; snapshots
+        # still store them under "mood_history"
+        self.mood_history = MoodSeries()
         
         self.created_at = datetime.now()
         self.last_updated = datetime.now()
@@ -761,7 +3044,6 @@ class UserProfile:
                     "crisis_alerts": True
                 }
             },
-            "mood_history": [],
             "goals": [],
             "session_stats": {
                 "total_sessions": 0,
@@ -779,6 +3061,14 @@ class UserProfile:
     
     def update_profile(self, updates: dict):
         """Update profile with new information"""
+        updates = copy.deepcopy(updates)
+        with self._write_lock:
+            self._apply_update(updates)
+            self.last_updated = datetime.now()
+            self._pending_ops.append(("update", updates))
+        self._changed()
+    
+    def _apply_update(self, updates: dict):
         def deep_update(base_dict, update_dict):
             for key, value in update_dict.items():
                 if key in base_dict and isinstance(base_dict[key], dict) and isinstance(value, dict):
@@ -786,47 +3076,157 @@ class UserProfile:
                 else:
                     base_dict[key] = value
         
+        # Applied again if a flush has to replay it, so never share its values
+        updates = copy.deepcopy(updates)
+        if "mood_history" in updates:
+            self.mood_history = MoodSeries.from_entries(updates.pop("mood_history") or [])
+            self.profile["session_stats"]["average_mood"] = self.mood_history.average or 5.0
         deep_update(self.profile, updates)
-        self.last_updated = datetime.now()
-        
-        if Config.ENABLE_ENCRYPTION:
-            self._save_profile()
+    
+    def _apply_op(self, op: tuple):
+        kind, data = op
+        if kind == "mood":
+            self._apply_mood_entry(data)
+        else:
+            self._apply_update(data)
+    
+    def _apply_mood_entry(self, entry: dict, when: Optional[datetime] = None):
+        """Add an entry to the in-memory history and update the running average"""
+        when = when or datetime.fromisoformat(entry["timestamp"])
+        self.mood_history.append(when.timestamp(), entry["mood_score"], entry["emotions"], entry["notes"])
+        self.profile["session_stats"]["average_mood"] = self.mood_history.average
     
     def add_mood_entry(self, mood_score: int, emotions: List[str], notes: str = ""):
-        """Add mood tracking entry"""
+        """Add mood tracking entry - O(1): one record queued for the mood log"""
+        now = datetime.now().replace(microsecond=0)
         entry = {
-            "timestamp": datetime.now().isoformat(),
-            "mood_score": mood_score,
+            "timestamp": now.isoformat(),
+            "mood_score": int(mood_score),
             "emotions": emotions,
             "notes": notes
         }
-        self.profile["mood_history"].append(entry)
+        with self._write_lock:
+            self._apply_mood_entry(entry, now)
+            self.last_updated = now
+            self._pending_ops.append(("mood", entry))
+        self._changed()
+    
+    def _changed(self):
+        if self.writer is not None:
+            self.writer.mark_dirty(self)
+        else:
+            self.flush()
+    
+    @property
+    def is_dirty(self) -> bool:
+        return bool(self._pending_ops)
+    
+    def flush(self, force_snapshot: bool = False):
+        """Write pending changes: mood log records, or a snapshot when one is due.
+
+        The store assigns each mood record its seq, so records appended by
+        several worker processes never collide. A snapshot is rewritten from
+        what the store holds, with this copy's pending operations replayed
+        onto it, so it never drops another process's changes either.
+        Serialising, encrypting and writing happen outside the write lock,
+        so requests keep mutating the profile meanwhile. On failure the
+        changes are put back for the next attempt.
+        """
+        with self._flush_lock:
+            with self._write_lock:
+                ops, self._pending_ops = self._pending_ops, []
+                if not ops and not force_snapshot:
+                    return
+                # Rewriting the snapshot costs O(history), so only do it once the
+                # log is as long as the snapshot: amortised O(1) per entry
+                log_size = self._mood_log_entries + len(ops)
+                snapshot_due = (
+                    force_snapshot or self._needs_rewrite
+                    or any(kind == "update" for kind, _ in ops)
+                    or log_size >= max(Config.MOOD_LOG_COMPACT_MIN, len(self.mood_history) // 2)
+                )
+            try:
+                if not snapshot_due:
+                    try:
+                        self._append_mood_records([entry for _, entry in ops])
+                    except ProfileStoreConflict:
+                        snapshot_due = True
+                if snapshot_due:
+                    self._rewrite_snapshot(ops)
+            except Exception:
+                with self._write_lock:
+                    self._pending_ops[:0] = ops
+                raise
+    
+    def _append_mood_records(self, entries: List[dict]):
+        before, after = self.store.append_mood_records(self.user_id, [
+            (datetime.fromisoformat(entry["timestamp"]).timestamp(), self.encrypt_data(entry))
+            for entry in entries
+        ])
+        with self._write_lock:
+            self._mood_log_entries += len(entries)
+            # If another process wrote in between, keep the old version so
+            # the registry reloads this copy once it is clean
+            if before == self.store_version:
+                self.store_version = after
+    
+    def _rewrite_snapshot(self, ops: List[tuple]):
+        """Replace the snapshot with the stored profile plus `ops`, then adopt the result"""
+        merged = {}
+        # Resolved up front: creating a data key may need the store's writer, which runs `merge`
+        cipher = self._write_cipher()
         
-        # Update session stats
-        moods = [entry["mood_score"] for entry in self.profile["mood_history"]]
-        if moods:
-            self.profile["session_stats"]["average_mood"] = sum(moods) / len(moods)
+        def merge(snapshot, mood_entries, records):
+            current = UserProfile(self.user_id, getattr(self, "keyring", None), None, self.store)
+            current.cipher = cipher
+            current._restore(current.decrypt_data(snapshot) if snapshot is not None else None, records)
+            for op in ops:
+                current._apply_op(op)
+            merged["profile"] = current
+            entries = current.mood_history.to_entries()
+            return current.encrypt_data(dict(current.profile, mood_history=entries)), len(entries)
         
-        if Config.ENABLE_ENCRYPTION:
-            self._save_profile()
+        version = self.store.rewrite(self.user_id, merge)
+        current = merged["profile"]
+        with self._write_lock:
+            # Changes made since this flush started are already applied here; replay them there too
+            for op in self._pending_ops:
+                current._apply_op(op)
+            self.profile, self.mood_history = current.profile, current.mood_history
+            # The snapshot now holds everything the log did
+            self._mood_log_entries = 0
+            self._needs_rewrite = False
+            self.store_version = version
+    
+    def compact(self):
+        """Fold the mood log and any pending entries into the snapshot"""
+        with self._write_lock:
+            if not self._mood_log_entries and not self._pending_ops:
+                return
+        self.flush(force_snapshot=True)
+    
+    def get_mood_analytics(self, windows=(7, 30, 90)) -> dict:
+        """Multi-window mood analytics in one vectorised pass"""
+        # Held so no append resizes the arrays while NumPy views them
+        with self._write_lock:
+            return mood_series_analytics(self.mood_history, windows)
     
     def get_mood_trends(self, days: int = 30) -> dict:
-        """Analyze mood trends over specified period"""
-        cutoff_date = datetime.now() - timedelta(days=days)
-        recent_moods = [
-            entry for entry in self.profile["mood_history"]
-            if datetime.fromisoformat(entry["timestamp"]) > cutoff_date
-        ]
+        """Analyze mood trends over the last `days` calendar days - O(log history)"""
+        series = self.mood_history
+        midnight = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        start = series.index_since((midnight - timedelta(days=days - 1)).timestamp())
+        count = len(series) - start
         
-        if not recent_moods:
+        if not count:
             return {"trend": "insufficient_data", "average": 5.0, "entries": 0}
         
-        scores = [entry["mood_score"] for entry in recent_moods]
-        average = sum(scores) / len(scores)
+        average = series.window_sum(start) / count
         
         # Calculate trend
-        if len(scores) > 1:
-            trend = "improving" if scores[-1] > scores[0] else "declining" if scores[-1] < scores[0] else "stable"
+        if count > 1:
+            first, last = series.scores[start], series.scores[-1]
+            trend = "improving" if last > first else "declining" if last < first else "stable"
         else:
             trend = "stable"
         
@@ -839,42 +3239,446 @@ class UserProfile:
         return {
             "trend": trend,
             "average": round(average, 1),
-            "entries": len(recent_moods),
+            "entries": count,
             "insights": insights,
-            "recent_scores": scores[-7:] if len(scores) >= 7 else scores
+            "recent_scores": series.scores[-min(count, 7):].tolist()
         }
     
-    def _save_profile(self):
-        """Save encrypted profile to file"""
-        encrypted_data = self.encrypt_data(self.profile)
-        with open(f"{self.data_dir}/profile.enc", "wb") as f:
-            f.write(encrypted_data)
+    def _restore(self, saved: Optional[dict], records: List[Tuple[Optional[int], bytes]]):
+        """Rebuild from a decrypted snapshot and the mood log records stored after it"""
+        def merge(defaults, stored):
+            # Keep keys added to the default structure since the file was written
+            for key, value in stored.items():
+                if isinstance(value, dict) and isinstance(defaults.get(key), dict):
+                    merge(defaults[key], value)
+                else:
+                    defaults[key] = value
+        if saved is not None:
+            self.mood_history = MoodSeries.from_entries(saved.pop("mood_history", []))
+            merge(self.profile, saved)
+        
+        for seq, line in records:
+            try:
+                record = self.decrypt_data(line)
+            except Exception:
+                # A torn final write after a crash - that entry is lost
+                logger.warning(f"Skipping unreadable mood log record for {self.user_id}")
+                continue
+            self._mood_log_entries += 1
+            # Records written before the store assigned seq numbers carry their own
+            legacy_seq = record.pop("seq", None)
+            if seq is None:
+                seq = legacy_seq
+                self._needs_rewrite = True
+            # Lower seqs are already in the snapshot (a crash hit before the log was emptied)
+            if seq is None or seq >= len(self.mood_history):
+                self._apply_mood_entry(record)
+    
+    @classmethod
+    def load(cls, user_id: str, keyring: Optional[ProfileKeyring] = None,
+             writer: Optional["ProfileWriteBehind"] = None, store=None) -> "UserProfile":
+        """Read a saved profile back from its store, or start a new one"""
+        user_profile = cls(user_id, keyring, writer, store)
+        snapshot, mood_entries, records, user_profile.store_version = user_profile.store.read(user_id)
+        if Config.ENABLE_ENCRYPTION and (snapshot is not None or records):
+            user_profile.cipher = user_profile.keyring.cipher_for(user_id, create=False)
+        saved = None
+        if snapshot is not None:
+            try:
+                saved = user_profile.decrypt_data(snapshot)
+            except Exception as e:
+                # e.g. written with a key that no longer exists - keep it, start fresh
+                unreadable = user_profile.store.quarantine(user_id)
+                logger.error(f"Could not read profile for {user_id} ({type(e).__name__}), moved it to {unreadable}")
+            else:
+                # Snapshot from before the store recorded its entry count
+                user_profile._needs_rewrite = mood_entries is None
+        user_profile._restore(saved, records)
+        return user_profile
+    
+    def _write_cipher(self) -> Optional[MultiFernet]:
+        """The data-key cipher, creating this user's data key on first use"""
+        if Config.ENABLE_ENCRYPTION and self.cipher is None:
+            self.cipher = self.keyring.cipher_for(self.user_id)
+        return self.cipher
     
     def encrypt_data(self, data: dict) -> bytes:
         """Encrypt sensitive data"""
         if not Config.ENABLE_ENCRYPTION:
             return json.dumps(data).encode()
         json_data = json.dumps(data, default=str)
-        return self.cipher.encrypt(json_data.encode())
+        return self._write_cipher().encrypt(json_data.encode())
     
     def decrypt_data(self, encrypted_data: bytes) -> dict:
         """Decrypt sensitive data"""
         if not Config.ENABLE_ENCRYPTION:
             return json.loads(encrypted_data.decode())
-        decrypted = self.cipher.decrypt(encrypted_data)
+        # No data key yet: anything stored predates per-user keys
+        decrypted = (self.cipher or self.keyring.master_cipher).decrypt(encrypted_data)
         return json.loads(decrypted.decode())
 
 
+class ProfileWriteBehind:
+    """Background flusher that coalesces UserProfile writes.
+
+    Request threads only mark a profile dirty; every `interval` seconds the
+    worker flushes each dirty profile once, however many changes it saw in
+    between. A crash loses at most the last interval of changes, and each
+    snapshot is replaced atomically, so it never leaves a torn file.
+    """
+    def __init__(self, interval: float = 1.0):
+        self.interval = interval
+        self._dirty = OrderedDict()  # user_id -> UserProfile, in the order they changed
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = False
+        self._thread = None
+        self._pid = None
+        self.flushes = 0
+        self.failures = 0
+        self.last_error = None
+    
+    @property
+    def depth(self) -> int:
+        return len(self._dirty)
+    
+    def mark_dirty(self, user_profile: "UserProfile"):
+        with self._lock:
+            self._dirty[user_profile.user_id] = user_profile
+        if self._stopped:
+            # Shutting down - nobody would flush it later
+            self.flush()
+            return
+        self._ensure_started()
+    
+    def pending(self, user_id: str) -> Optional["UserProfile"]:
+        """A profile with unflushed changes; reloading it from disk would lose them"""
+        with self._lock:
+            return self._dirty.get(user_id)
+    
+    def _ensure_started(self):
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name="profile-write-behind", daemon=True)
+            self._thread.start()
+    
+    def _run(self):
+        while not self._stopped:
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+            self.flush()
+    
+    def flush(self):
+        """Flush every dirty profile; failed ones stay queued for the next pass"""
+        with self._lock:
+            batch = list(self._dirty.items())
+        for user_id, user_profile in batch:
+            try:
+                user_profile.flush()
+                self.flushes += 1
+            except Exception as e:
+                self.failures += 1
+                self.last_error = str(e)
+                logger.error(f"Could not persist profile {user_id}, will retry: {e}")
+                continue
+            # Entries stay listed until written, so pending() never misses one
+            # mid-flush; keep those that changed again meanwhile
+            with self._lock:
+                if not user_profile.is_dirty and self._dirty.get(user_id) is user_profile:
+                    del self._dirty[user_id]
+    
+    def stop(self, timeout: float = 5.0):
+        """Flush what is pending and stop the worker; later changes flush synchronously"""
+        self._stopped = True
+        self._wakeup.set()
+        if self._thread is not None and self._thread.is_alive():
+            self._thread.join(timeout)
+        self.flush()
+    
+    def stats(self) -> dict:
+        return {
+            "dirty_profiles": self.depth,
+            "flushes": self.flushes,
+            "failures": self.failures,
+            "interval_seconds": self.interval,
+            "last_error": self.last_error
+        }
+
+
+class UserProfileRegistry:
+    """Bounded LRU of UserProfile objects backed by a profile store.
+
+    Profiles are loaded on first use and their changes persisted through the
+    write-behind `writer`, so evicting the least recently used one only drops
+    it from memory; it is read back the next time that user shows up (or
+    taken from the writer if it still has unflushed changes). Resident memory
+    therefore follows the number of active users, not everyone who ever
+    logged in.
+    """
+    def __init__(self, max_profiles: int = 1000, writer: Optional[ProfileWriteBehind] = None, store=None):
+        self.max_profiles = max_profiles
+        self.writer = writer
+        self.store = store or FileProfileStore(Config.USER_DATA_DIR)
+        self._profiles = OrderedDict()  # user_id -> UserProfile
+        self._lock = threading.Lock()
+        self._load_locks = {}  # user_id -> Lock while a load is in progress
+        self._keyring = None
+        self.metrics = {"hits": 0, "loads": 0, "revived": 0, "refreshed": 0, "evictions": 0}
+    
+    @property
+    def keyring(self) -> ProfileKeyring:
+        if self._keyring is None:
+            self._keyring = ProfileKeyring(load_encryption_key(), self.store, Config.DATA_KEY_CACHE_SIZE)
+        return self._keyring
+    
+    def get(self, user_id: str) -> UserProfile:
+        with self._lock:
+            user_profile = self._profiles.get(user_id)
+            if user_profile is not None:
+                self._profiles.move_to_end(user_id)
+        
+        # Another worker process may have written this profile since it was
+        # loaded; reload a clean copy, keep a dirty one (its changes are
+        # replayed onto the stored profile when it is next written)
+        if user_profile is not None:
+            if user_profile.is_dirty or self.store.version(user_id) == user_profile.store_version:
+                with self._lock:
+                    self.metrics["hits"] += 1
+                return user_profile
+            with self._lock:
+                if self._profiles.get(user_id) is user_profile:
+                    del self._profiles[user_id]
+                    self.metrics["refreshed"] += 1
+        
+        with self._lock:
+            load_lock = self._load_locks.setdefault(user_id, threading.Lock())
+        
+        # Disk I/O happens outside the registry lock; concurrent requests for
+        # the same user wait on its load lock instead of loading twice
+        with load_lock:
+            with self._lock:
+                user_profile = self._profiles.get(user_id)
+            if user_profile is None:
+                try:
+                    # Evicted with changes not yet written: reuse it, the file is stale
+                    user_profile = self.writer.pending(user_id) if self.writer is not None else None
+                    loaded = user_profile is None
+                    if loaded:
+                        keyring = self.keyring if Config.ENABLE_ENCRYPTION else None
+                        user_profile = UserProfile.load(user_id, keyring, self.writer, self.store)
+                except Exception:
+                    with self._lock:
+                        self._load_locks.pop(user_id, None)
+                    raise
+                # Publish the profile and retire the load lock together, so a
+                # request can't find neither and load a second copy
+                with self._lock:
+                    self._load_locks.pop(user_id, None)
+                    self.metrics["loads" if loaded else "revived"] += 1
+                    self._profiles[user_id] = user_profile
+                    while len(self._profiles) > self.max_profiles:
+                        self._profiles.popitem(last=False)
+                        self.metrics["evictions"] += 1
+        return user_profile
+    
+    def __len__(self):
+        return len(self._profiles)
+    
+    def stats(self) -> dict:
+        return {
+            **self.metrics,
+            "resident": len(self._profiles),
+            "max_profiles": self.max_profiles,
+            "data_keys": self._keyring.stats() if self._keyring is not None else None
+        }
+
+
+class EmbeddingCache:
+    """On-disk store of sentence embeddings keyed by content hash.
+
+    Vectors live in append-only .npy segments (memory-mapped on load) with a
+    JSON manifest listing the segments and mapping each content hash to its
+    row across them. The manifest records the model name, so switching models
+    never serves stale vectors.
+
+    New vectors go to a new segment, so adding a document writes its rows and
+    the manifest rather than the whole matrix; past MAX_SEGMENTS the segments
+    are merged into one. Writers take an exclusive flock on the cache's .lock
+    file and re-read the manifest first, so workers sharing the directory
+    extend each other's segments instead of replacing them, and any matrix
+    file the manifest no longer names (a merged segment, a crashed write) is
+    removed while the lock is held. The manifest itself is replaced with one
+    atomic rename: a reader sees either the old segment list or the new one.
+    """
+    MAX_SEGMENTS = 32
+    
+    def __init__(self, cache_dir: str, model_name: str):
+        self.model_name = model_name
+        self.cache_dir = cache_dir
+        self.safe_name = "".join(c if c.isalnum() or c in "-_." else "_" for c in model_name)
+        os.makedirs(cache_dir, exist_ok=True)
+        self.manifest_path = os.path.join(cache_dir, f"{self.safe_name}.json")
+        self._segments = []
+        self._rows = {}
+        self._matrix = None
+        self._manifest_version = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        with self._locked():
+            self._load_unlocked()
+            self._remove_unreferenced()
+        if self._rows:
+            logger.info(f"✅ Loaded {len(self._rows)} cached embeddings from {len(self._segments)} segment(s)")
+    
+    @staticmethod
+    def content_hash(text: str) -> str:
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+    
+    @contextmanager
+    def _locked(self):
+        fd = os.open(os.path.join(self.cache_dir, f"{self.safe_name}.lock"), os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            if fcntl is not None:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+            yield
+        finally:
+            os.close(fd)  # releases the flock
+    
+    def _load_unlocked(self):
+        """Adopt the manifest on disk unless it is the one already loaded"""
+        try:
+            st = os.stat(self.manifest_path)
+        except FileNotFoundError:
+            self._segments, self._rows, self._matrix, self._manifest_version = [], {}, None, None
+            return
+        version = (st.st_ino, st.st_size, st.st_mtime_ns)
+        if version == self._manifest_version:
+            return
+        self._segments, self._rows, self._matrix, self._manifest_version = [], {}, None, version
+        try:
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+            # One "matrix" before segments existed; a fixed file name before that
+            segments = manifest.get("segments") or [manifest.get("matrix") or f"{self.safe_name}.npy"]
+            parts = [np.load(os.path.join(self.cache_dir, name), mmap_mode="r") for name in segments]
+            matrix = parts[0] if len(parts) == 1 else np.concatenate(parts)
+            if manifest.get("model") != self.model_name or len(manifest.get("rows", {})) != matrix.shape[0]:
+                logger.warning("Embedding cache does not match the current model, rebuilding")
+                return
+            self._segments, self._rows, self._matrix = segments, manifest["rows"], matrix
+        except Exception as e:
+            logger.error(f"Could not read embedding cache, rebuilding: {e}")
+    
+    def _write_segment(self, vectors: np.ndarray) -> str:
+        fd, path = tempfile.mkstemp(dir=self.cache_dir, prefix=f"{self.safe_name}.", suffix=".npy")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                np.save(f, vectors)
+                f.flush()
+                os.fsync(f.fileno())
+        except Exception:
+            os.remove(path)
+            raise
+        return os.path.basename(path)
+    
+    def _write_manifest(self, segments: List[str], rows: Dict[str, int]):
+        fd, manifest_tmp = tempfile.mkstemp(dir=self.cache_dir, prefix=f"{self.safe_name}.", suffix=".json.tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump({"model": self.model_name, "segments": segments, "rows": rows}, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(manifest_tmp, self.manifest_path)
+        except Exception:
+            if os.path.exists(manifest_tmp):
+                os.remove(manifest_tmp)
+            raise
+        st = os.stat(self.manifest_path)
+        self._manifest_version = (st.st_ino, st.st_size, st.st_mtime_ns)
+    
+    def _remove_unreferenced(self):
+        """Delete this model's matrix and temp files the manifest doesn't name (caller holds the flock)"""
+        # mkstemp names: "<safe_name>." + 8 random characters + suffix; "<safe_name>.npy" is the old fixed name
+        random_chars = set("abcdefghijklmnopqrstuvwxyz0123456789_")
+        prefix = f"{self.safe_name}."
+        for name in os.listdir(self.cache_dir):
+            if not name.startswith(prefix) or name in self._segments:
+                continue
+            stem = name[len(prefix):]
+            suffix = next((s for s in (".npy", ".json.tmp") if stem.endswith(s)), None)
+            if stem == "npy" or suffix and len(stem) - len(suffix) == 8 and set(stem[:8]) <= random_chars:
+                try:
+                    os.remove(os.path.join(self.cache_dir, name))
+                except FileNotFoundError:
+                    pass
+    
+    def _append(self, hashes: List[str], vectors: np.ndarray):
+        """Persist new vectors as a segment on top of whatever the manifest on disk holds now"""
+        with self._locked():
+            # Another worker may have appended (or merged) since our last look
+            self._load_unlocked()
+            fresh = [i for i, content_hash in enumerate(hashes) if content_hash not in self._rows]
+            if fresh:
+                start = 0 if self._matrix is None else self._matrix.shape[0]
+                rows = dict(self._rows)
+                for offset, i in enumerate(fresh):
+                    rows[hashes[i]] = start + offset
+                matrix = vectors[fresh] if self._matrix is None else np.concatenate([self._matrix, vectors[fresh]])
+                if len(self._segments) < self.MAX_SEGMENTS:
+                    segments = self._segments + [self._write_segment(vectors[fresh])]
+                else:
+                    segments = [self._write_segment(matrix)]
+                self._write_manifest(segments, rows)
+                self._segments, self._rows, self._matrix = segments, rows, matrix
+            # Readers that mapped a merged-away segment keep their mapping
+            self._remove_unreferenced()
+    
+    def get_many(self, texts: List[str], encode) -> np.ndarray:
+        """Return float32 embeddings for `texts`, encoding only the ones not cached yet"""
+        hashes = [self.content_hash(text) for text in texts]
+        with self._lock:
+            missing = {}
+            for text, content_hash in zip(texts, hashes):
+                if content_hash not in self._rows and content_hash not in missing:
+                    missing[content_hash] = text
+            self.misses += len(missing)
+            self.hits += len(texts) - len(missing)
+            
+            if missing:
+                new_vectors = np.asarray(encode(list(missing.values())), dtype="float32")
+                new_vectors = new_vectors.reshape(len(missing), -1)
+                try:
+                    self._append(list(missing), new_vectors)
+                except Exception as e:
+                    logger.error(f"Could not persist embedding cache: {e}")
+                    # Serve them from memory; the next successful append re-reads the disk state
+                    start = 0 if self._matrix is None else self._matrix.shape[0]
+                    self._matrix = new_vectors if self._matrix is None else np.concatenate([self._matrix, new_vectors])
+                    for offset, content_hash in enumerate(missing):
+                        self._rows[content_hash] = start + offset
+                    self._manifest_version = None
+            
+            return np.asarray(self._matrix[[self._rows[h] for h in hashes]], dtype="float32")
+    
+    def stats(self) -> dict:
+        return {"entries": len(self._rows), "segments": len(self._segments), "hits": self.hits, "misses": self.misses}
+
+
 class PsychologyKnowledgeBase:
     """Vector-based knowledge base for psychological resources"""
     def __init__(self):
         self.model = None
         self.index = None
+        self.embedding_cache = None
         self.knowledge = []
         
         try:
-            self.model = SentenceTransformer('all-MiniLM-L6-v2')
+            self.model = sentence_transformers.SentenceTransformer(Config.EMBEDDING_MODEL)
             self.index = faiss.IndexFlatL2(384)
+            self.embedding_cache = EmbeddingCache(Config.EMBEDDING_CACHE_DIR, Config.EMBEDDING_MODEL)
             self.knowledge = []
             self.load_resources()
             logger.info("✅ Vector knowledge base initialized")
@@ -1158,18 +3962,18 @@ class PsychologyKnowledgeBase:
 ]
         
         if self.model and self.index:
-            embeddings = []
-            for resource in resources:
-                try:
-                    embedding = self.model.encode(resource["content"])
-                    embeddings.append(embedding)
-                    self.knowledge.append((resource["content"], resource))
-                except Exception as e:
-                    logger.error(f"Error encoding resource: {e}")
-            if embeddings:
-                embeddings_array = np.array(embeddings).astype('float32')
+            try:
+                # Only new or changed resources are actually encoded
+                embeddings_array = self.embedding_cache.get_many(
+                    [resource["content"] for resource in resources], self.model.encode
+                )
                 self.index.add(embeddings_array)
-                logger.info(f"✅ Loaded {len(embeddings)} resources into vector DB")
+                for resource in resources:
+                    self.knowledge.append((resource["content"], resource))
+                logger.info(f"✅ Loaded {len(resources)} resources into vector DB "
+                            f"({self.embedding_cache.misses} newly encoded)")
+            except Exception as e:
+                logger.error(f"Error encoding resources: {e}")
         else:
             for resource in resources:
                 self.knowledge.append((resource["content"], resource))
@@ -1223,11 +4027,10 @@ class PsychologyKnowledgeBase:
             
         if self.model and self.index:
             try:
-                embedding = self.model.encode(resource["content"])
+                embeddings_array = self.embedding_cache.get_many([resource["content"]], self.model.encode)
                 self.knowledge.append((resource["content"], resource))
                 
                 # Update FAISS index
-                embeddings_array = np.array([embedding]).astype('float32')
                 self.index.add(embeddings_array)
                 logger.info(f"Added resource to vector DB: {resource['content'][:30]}...")
             except Exception as e:
@@ -1484,31 +4287,23 @@ class AdvancedSymptomAnalyzer:
 class AIService:
     """AI service handler with enhanced error handling"""
     def __init__(self):
-        self.ollama_available = False
-        self.model_available = False
         self.initialize_service()
     
+    @property
+    def ollama_available(self) -> bool:
+        return ollama_bootstrap.is_server_up()
+    
+    @property
+    def model_available(self) -> bool:
+        return ollama_bootstrap.is_ready()
+    
     def initialize_service(self):
         logger.info("🔍 Connecting to Ollama...")
-        try:
-            # Check service status
-            response = requests.get(f"{Config.OLLAMA_HOST}/api/version", timeout=10)
-            response.raise_for_status()
-            self.ollama_available = True
-            logger.info(f"✅ Ollama service is running")
-            
-            # Verify model availability
-            models = requests.get(f"{Config.OLLAMA_HOST}/api/tags").json().get("models", [])
-            model_names = [m["name"] for m in models]
-            if Config.OLLAMA_MODEL in model_names:
-                self.model_available = True
-                logger.info(f"✅ Model {Config.OLLAMA_MODEL} is available")
-            else:
-                logger.error(f"❌ Model {Config.OLLAMA_MODEL} not found in Ollama")
-                logger.info(f"Available models: {', '.join(model_names)}")
-                
-        except Exception as e:
-            logger.error(f"❌ Ollama connection failed: {str(e)}")
+        # The bootstrap thread owns the readiness probing; never block here
+        if ollama_bootstrap.is_ready():
+            logger.info(f"✅ Model {Config.OLLAMA_MODEL} is available")
+        else:
+            logger.info(f"⏳ Ollama is {ollama_bootstrap.state} - using fallback responses until it is ready")
     
     def get_chat_completion(self, messages: list, **kwargs) -> str:
         """Get AI response with comprehensive error handling"""
@@ -1569,6 +4364,22 @@ class AIService:
             logger.error(f"Direct response error: {str(e)}")
             return "I had trouble generating a response. Please try again."
     
+    def warm_up(self, wait: float = 0) -> bool:
+        """Load the model into Ollama memory with a one-token generation.
+
+        Waits up to `wait` seconds for Ollama to come up; False if it didn't.
+        """
+        if not ollama_bootstrap.wait_until_ready(wait):
+            return False
+        response = requests.post(
+            f"{Config.OLLAMA_HOST}/api/generate",
+            json={"model": Config.OLLAMA_MODEL, "prompt": "Hello", "stream": False,
+                  "options": {"num_predict": 1}},
+            timeout=120
+        )
+        response.raise_for_status()
+        return True
+    
     def _fallback_response(self, stream: bool):
         """Fallback when Ollama isn't available"""
         message = (
@@ -1580,9 +4391,10 @@ class AIService:
 
 class EnhancedPsychologyService:
     """Psychology service integrating AI and therapeutic approaches"""
-    def __init__(self, ai_service: AIService):
+    def __init__(self, ai_service: AIService, knowledge_base: "PsychologyKnowledgeBase" = None):
         self.ai_service = ai_service
-        self.knowledge_base = PsychologyKnowledgeBase()
+        # Share the application-wide knowledge base instead of building a second one
+        self.knowledge_base = knowledge_base or PsychologyKnowledgeBase()
         self.user_history_cache = {}  # Cache for user session history
         logger.info("🧠 Psychology service initialized")
     
@@ -1734,9 +4546,8 @@ class EnhancedAudioService:
             return {"text": "Could not process audio", "emotions": {}}
     
     def _analyze_emotions(self, text: str) -> Dict[str, float]:
-        """Simple emotion analysis from text"""
-        analyzer = AdvancedSymptomAnalyzer()
-        return analyzer._analyze_emotions(text)
+        """Simple emotion analysis from text using the shared (already loaded) analyzer"""
+        return app_globals.symptom_analyzer._analyze_emotions(text)
 
 
 class EnhancedPDFService:
@@ -1861,7 +4672,7 @@ class EnhancedPDFService:
 # APPLICATION GLOBALS
 # ========================
 class AppGlobals:
-    """Container for global services with lazy initialization"""
+    """Container for global services with lazy, thread-safe initialization"""
     def __init__(self):
         self._ai_service = None
         self._psych_service = None
@@ -1869,43 +4680,49 @@ class AppGlobals:
         self._session_manager = None
         self._knowledge_base = None
         self._symptom_analyzer = None
-        self._user_profiles = {}
+        self.profile_writer = ProfileWriteBehind(Config.PROFILE_FLUSH_INTERVAL)
+        self.profile_store = create_profile_store()
+        self.user_profiles = UserProfileRegistry(Config.MAX_CACHED_PROFILES, self.profile_writer, self.profile_store)
+        # One lock per service so independent models can load concurrently
+        self._init_locks = {
+            name: threading.Lock()
+            for name in ("_ai_service", "_psych_service", "_audio_service",
+                         "_session_manager", "_knowledge_base", "_symptom_analyzer")
+        }
+    
+    def _get_or_create(self, attr: str, factory):
+        service = getattr(self, attr)
+        if service is None:
+            with self._init_locks[attr]:
+                service = getattr(self, attr)
+                if service is None:
+                    service = factory()
+                    setattr(self, attr, service)
+        return service
     
     @property
     def ai_service(self):
-        if self._ai_service is None:
-            self._ai_service = AIService()
-        return self._ai_service
+        return self._get_or_create("_ai_service", AIService)
     
     @property
     def psych_service(self):
-        if self._psych_service is None:
-            self._psych_service = EnhancedPsychologyService(self.ai_service)
-        return self._psych_service
+        return self._get_or_create("_psych_service", lambda: EnhancedPsychologyService(self.ai_service, self.knowledge_base))
     
     @property
     def audio_service(self):
-        if self._audio_service is None:
-            self._audio_service = EnhancedAudioService(Config.LOCAL_WHISPER_MODEL)
-        return self._audio_service
+        return self._get_or_create("_audio_service", lambda: EnhancedAudioService(Config.LOCAL_WHISPER_MODEL))
     
     @property
     def session_manager(self):
-        if self._session_manager is None:
-            self._session_manager = SessionManager()
-        return self._session_manager
+        return self._get_or_create("_session_manager", SessionManager)
     
     @property
     def knowledge_base(self):
-        if self._knowledge_base is None:
-            self._knowledge_base = PsychologyKnowledgeBase()
-        return self._knowledge_base
+        return self._get_or_create("_knowledge_base", PsychologyKnowledgeBase)
     
     @property
     def symptom_analyzer(self):
-        if self._symptom_analyzer is None:
-            self._symptom_analyzer = AdvancedSymptomAnalyzer()
-        return self._symptom_analyzer
+        return self._get_or_create("_symptom_analyzer", AdvancedSymptomAnalyzer)
 
 app_globals = AppGlobals()
 
@@ -1913,9 +4730,7 @@ def get_or_create_user_profile(user_id: str = None) -> UserProfile:
     """Get or create user profile with proper initialization"""
     if not user_id:
         user_id = f"user_{int(time.time())}"
-    if user_id not in app_globals._user_profiles:
-        app_globals._user_profiles[user_id] = UserProfile(user_id)
-    return app_globals._user_profiles[user_id]
+    return app_globals.user_profiles.get(user_id)
 
 
 def monitor_system():
@@ -1933,6 +4748,205 @@ def monitor_system():
             logger.error(f"Monitoring error: {e}")
 
 
+# ========================
+# MODEL WARM-UP
+# ========================
+class ModelWarmup:
+    """Loads every model concurrently on a thread pool and runs one dummy inference through each.
+
+    `/api/ready` only reports ready once every warm-up has succeeded, so the
+    first real user never pays the cold-load and first-inference cost. A
+    probe that fails (or returns False, like the LLM warm-up while Ollama is
+    down) is retried by start() after `retry_interval` seconds, doubling up
+    to `max_retry_interval`, for at most `max_attempts` passes.
+    """
+    def __init__(self, globals_container: AppGlobals, max_workers: int = 4, retry_interval: float = 30.0,
+                 max_retry_interval: float = 600.0, max_attempts: int = 8):
+        self.globals = globals_container
+        self.max_workers = max_workers
+        self.retry_interval = retry_interval
+        self.max_retry_interval = max_retry_interval
+        self.max_attempts = max_attempts
+        self.attempts = 0
+        self.results = {}
+        self.started_at = None
+        self.finished_at = None
+        self.done_event = threading.Event()
+        self._lock = threading.Lock()
+        self._thread = None
+        self._pid = None
+        self._last_attempt = None
+    
+    def _tasks(self) -> dict:
+        """name -> (loader, dummy inference)"""
+        g = self.globals
+        return {
+            "ai_service": (lambda: g.ai_service, lambda svc: svc.warm_up(wait=Config.WARMUP_OLLAMA_WAIT)),
+            "knowledge_base": (lambda: g.knowledge_base,
+                               lambda kb: kb.retrieve_resources("coping with anxiety", k=1)),
+            "psych_service": (lambda: g.psych_service,
+                              lambda svc: svc.knowledge_base.retrieve_resources("stress", k=1)),
+            "symptom_analyzer": (lambda: g.symptom_analyzer,
+                                 lambda sa: sa.analyze_text("I feel a bit anxious about tomorrow")),
+            "audio_service": (lambda: g.audio_service,
+                              lambda svc: svc.model.transcribe(np.zeros(16000, dtype=np.float32), fp16=False)
+                              if svc.model else None),
+            "session_manager": (lambda: g.session_manager, None),
+        }
+    
+    def _warm(self, name: str, loader, probe) -> dict:
+        process = psutil.Process()
+        rss_before = process.memory_info().rss
+        result = {"status": "ok", "load_seconds": None, "inference_seconds": None}
+        start = time.perf_counter()
+        try:
+            service = loader()
+            result["load_seconds"] = round(time.perf_counter() - start, 3)
+            if probe is not None:
+                probe_start = time.perf_counter()
+                if probe(service) is False:
+                    raise RuntimeError("warm-up skipped, service not ready")
+                result["inference_seconds"] = round(time.perf_counter() - probe_start, 3)
+        except Exception as e:
+            result["status"] = "failed"
+            result["error"] = str(e)
+            logger.error(f"❌ Warm-up failed for {name}: {e}")
+        # Loads overlap, so the RSS delta is an approximation per model
+        result["rss_delta_mb"] = round((process.memory_info().rss - rss_before) / (1024 * 1024), 1)
+        logger.info(f"🔥 Warmed {name}: load {result['load_seconds']}s, "
+                    f"inference {result['inference_seconds']}s, ~{result['rss_delta_mb']} MB")
+        return result
+    
+    def pending(self) -> List[str]:
+        """Models not successfully warmed yet"""
+        with self._lock:
+            return [name for name in self._tasks() if self.results.get(name, {}).get("status") != "ok"]
+    
+    def run(self, names: List[str] = None) -> dict:
+        """Warm `names` (default: every model not warmed yet) and block until all of them are done"""
+        from concurrent.futures import ThreadPoolExecutor, as_completed
+        
+        names = self.pending() if names is None else names
+        tasks = self._tasks()
+        self._last_attempt = time.time()
+        self.attempts += 1
+        self.started_at = self.started_at or self._last_attempt
+        logger.info(f"🚀 Warming up {len(names)} model(s) on {self.max_workers} threads...")
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="warmup") as executor:
+            futures = {
+                executor.submit(self._warm, name, *tasks[name]): name
+                for name in names
+            }
+            for future in as_completed(futures):
+                with self._lock:
+                    self.results[futures[future]] = future.result()
+        self.finished_at = time.time()
+        failed = self.pending()
+        if not failed:
+            self.done_event.set()
+            logger.info(f"✅ Warm-up finished in {self.finished_at - self.started_at:.1f}s "
+                        f"(RSS {psutil.Process().memory_info().rss / (1024 * 1024):.0f} MB)")
+        else:
+            if self.attempts < self.max_attempts:
+                logger.warning(f"⚠️ Not warmed yet: {', '.join(failed)} - retrying in {self._retry_delay():.0f}s")
+            else:
+                logger.error(f"❌ Giving up warming {', '.join(failed)} after {self.attempts} attempts")
+        return self.report()
+    
+    def start(self):
+        """Run the warm-up on a background thread, unless it already ran (idempotent, fork-aware).
+
+        A worker forked from a master that preloaded inherits the finished
+        warm-up; one forked mid-way has no thread left and starts its own.
+        """
+        if self.done_event.is_set():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                if self._thread is not None and self._thread.is_alive():
+                    return
+                # Failed warm-ups are retried, but not on every request
+                if self.attempts >= self.max_attempts:
+                    return
+                if self._last_attempt and time.time() - self._last_attempt < self._retry_delay():
+                    return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self.run, name="model-warmup", daemon=True)
+            self._thread.start()
+    
+    def _retry_delay(self) -> float:
+        return min(self.max_retry_interval, self.retry_interval * 2 ** max(0, self.attempts - 1))
+    
+    def is_ready(self) -> bool:
+        return self.done_event.is_set()
+    
+    def report(self) -> dict:
+        with self._lock:
+            models = dict(self.results)
+        return {
+            "ready": self.is_ready(),
+            "pending": self.pending(),
+            "attempts": self.attempts,
+            "started_at": datetime.fromtimestamp(self.started_at).isoformat() if self.started_at else None,
+            "total_seconds": round(self.finished_at - self.started_at, 2) if self.finished_at else None,
+            "models": models
+        }
+
+
+model_warmup = ModelWarmup(app_globals, max_workers=Config.WARMUP_WORKERS, max_attempts=Config.WARMUP_MAX_ATTEMPTS)
+
+
+class ChatStreamTracker:
+    """Counts in-flight /api/chat streams so a shutting-down worker can drain them"""
+    def __init__(self):
+        self._in_flight = 0
+        self._draining = False
+        self.draining_since = None
+        self._condition = threading.Condition()
+    
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+    
+    @property
+    def draining(self) -> bool:
+        return self._draining
+    
+    def begin(self) -> bool:
+        """Register a new stream; refused once draining has started"""
+        with self._condition:
+            if self._draining:
+                return False
+            self._in_flight += 1
+            return True
+    
+    def end(self):
+        with self._condition:
+            self._in_flight = max(0, self._in_flight - 1)
+            self._condition.notify_all()
+    
+    def start_draining(self):
+        with self._condition:
+            if not self._draining:
+                self._draining = True
+                self.draining_since = time.monotonic()
+    
+    def drain(self, timeout: float = None) -> bool:
+        """Refuse new streams and wait until the in-flight ones finish.
+
+        `timeout` counts from when draining started, so time the server
+        already spent waiting for requests isn't waited a second time.
+        """
+        self.start_draining()
+        with self._condition:
+            if timeout is not None:
+                timeout = max(0.0, timeout - (time.monotonic() - self.draining_since))
+            return self._condition.wait_for(lambda: self._in_flight == 0, timeout)
+
+
+chat_stream_tracker = ChatStreamTracker()
+
+
 # ========================
 # FLASK APPLICATION
 # ========================
@@ -2038,6 +5052,24 @@ def configure_cors():
 # Apply enhanced CORS configuration
 configure_cors()
 
+# Every request gets one retry budget shared by all the layers it calls into
+@app.before_request
+def _start_retry_deadline():
+    request.retry_deadline_token = _retry_deadline.set(time.monotonic() + Config.REQUEST_DEADLINE_SECONDS)
+
+def _ensure_warmup_started():
+    model_warmup.start()
+
+# Without preloading, the process serving requests warms its own models
+if Config.WARMUP_ON_FIRST_REQUEST:
+    app.before_request(_ensure_warmup_started)
+
+@app.teardown_request
+def _clear_retry_deadline(exc=None):
+    token = getattr(request, "retry_deadline_token", None)
+    if token is not None:
+        _retry_deadline.reset(token)
+
 # Add an error handler for bad requests that might occur during registration/login
 @app.errorhandler(400)
 def bad_request_handler(error):
@@ -2144,69 +5176,49 @@ def register():
         clean_username = data["username"].strip()
         clean_email = data["email"].strip()
         
-        # Attempt to create the user with multiple retry attempts if needed
-        max_create_retries = 3
-        create_retry = 0
+        # create_user retries transient database errors itself, within this
+        # request's deadline - no second retry loop here
         user_id = None
-        
-        while create_retry < max_create_retries and not user_id:
-            try:
-                user_id = user_manager.create_user(
-                    clean_username,
-                    data["password"],  # Password already validated
-                    clean_email
-                )
-                break  # Success, exit retry loop
-                
-            except ValueError as ve:
-                # This is a client error (duplicate user, invalid data)
-                error_msg = str(ve)
-                logger.warning(f"User creation failed (client error): {error_msg} for {clean_username}/{clean_email}")
-                
-                if "already exists" in error_msg.lower():
-                    # Return 409 Conflict for duplicates with detailed error
-                    return jsonify({
-                        "error": error_msg,
-                        "success": False,
-                        "code": "duplicate_user",
-                        "detail": "A user with this username or email already exists. Please try a different username or email."
-                    }), 409
-                else:
-                    # Other validation errors
-                    return jsonify({
-                        "error": error_msg,
-                        "success": False
-                    }), 400
-                    
-            except sqlite3.OperationalError as oe:
-                error_msg = str(oe)
-                if "database is locked" in error_msg and create_retry < max_create_retries - 1:
-                    # Try again with database lock issues
-                    logger.warning(f"Database locked during registration (attempt {create_retry+1}), retrying...")
-                    create_retry += 1
-                    time.sleep(1.0 * (create_retry + 1))  # Increasing delay
-                else:
-                    # Persistent database error, log and return 500
-                    logger.error(f"Persistent database error during registration: {error_msg}")
-                    return jsonify({
-                        "error": "Registration temporarily unavailable. Please try again in a few moments.",
-                        "success": False,
-                        "retry_after": 5  # Suggest retry after 5 seconds
-                    }), 503  # Service Unavailable
-                    
-            except Exception as create_error:
-                logger.error(f"User creation failed (system error): {str(create_error)}")
-                
-                if create_retry < max_create_retries - 1:
-                    logger.warning(f"Retrying registration after error (attempt {create_retry+1})")
-                    create_retry += 1
-                    time.sleep(1.0)
-                else:
-                    # After all retries, return a generic error to the client
-                    return jsonify({
-                        "error": "Registration failed due to a system error. Please try again later.",
-                        "success": False
-                    }), 500
+        try:
+            user_id = user_manager.create_user(
+                clean_username,
+                data["password"],  # Password already validated
+                clean_email
+            )
+        except ValueError as ve:
+            # This is a client error (duplicate user, invalid data)
+            error_msg = str(ve)
+            logger.warning(f"User creation failed (client error): {error_msg} for {clean_username}/{clean_email}")
+            
+            if "already exists" in error_msg.lower():
+                # Return 409 Conflict for duplicates with detailed error
+                return jsonify({
+                    "error": error_msg,
+                    "success": False,
+                    "code": "duplicate_user",
+                    "detail": "A user with this username or email already exists. Please try a different username or email."
+                }), 409
+            else:
+                # Other validation errors
+                return jsonify({
+                    "error": error_msg,
+                    "success": False
+                }), 400
+        except sqlite3.OperationalError as oe:
+            # Persistent database error, log and return 503
+            logger.error(f"Persistent database error during registration: {str(oe)}")
+            return jsonify({
+                "error": "Registration temporarily unavailable. Please try again in a few moments.",
+                "success": False,
+                "retry_after": 5  # Suggest retry after 5 seconds
+            }), 503  # Service Unavailable
+        except Exception as create_error:
+            # Return a generic error to the client
+            logger.error(f"User creation failed (system error): {str(create_error)}")
+            return jsonify({
+                "error": "Registration failed due to a system error. Please try again later.",
+                "success": False
+            }), 500
             
         # If we got here with a user_id, the registration was successful
         if user_id:
@@ -2312,59 +5324,33 @@ def login():
             "success": False
         }), 400
     
-    # Attempt to authenticate with multiple retries for database lock issues
-    max_auth_retries = 3
-    auth_retry = 0
+    # authenticate_user retries transient database errors itself, within
+    # this request's deadline
     user_id = None
-    
-    while auth_retry < max_auth_retries and user_id is None:
-        try:
-            # Clean up the username
-            username = data["username"].strip() if isinstance(data["username"], str) else data["username"]
-            
-            # Attempt authentication
-            user_id = user_manager.authenticate_user(
-                username,
-                data["password"]
-            )
-            
-            # No need to retry if user doesn't exist or password is wrong
-            if user_id is None:
-                break
-                
-        except sqlite3.OperationalError as oe:
-            error_msg = str(oe)
-            if "database is locked" in error_msg and auth_retry < max_auth_retries - 1:
-                # Retry on database lock
-                logger.warning(f"Database locked during login (attempt {auth_retry+1}), retrying...")
-                auth_retry += 1
-                time.sleep(1.0 * (auth_retry + 1))  # Increasing delay with each retry
-            else:
-                # Persistent database error
-                logger.error(f"Persistent database error during login: {error_msg}")
-                return jsonify({
-                    "error": "Login service temporarily unavailable. Please try again in a few moments.",
-                    "success": False,
-                    "retry_after": 5
-                }), 503  # Service Unavailable
-        except Exception as e:
-            logger.error(f"Error during login: {str(e)}")
-            
-            if auth_retry < max_auth_retries - 1:
-                auth_retry += 1
-                time.sleep(1.0)
-            else:
-                # After all retries, return a system error
-                return jsonify({
-                    "error": "Login failed due to a system error. Please try again later.",
-                    "success": False
-                }), 500
+    try:
+        # Clean up the username
+        username = data["username"].strip() if isinstance(data["username"], str) else data["username"]
+        user_id = user_manager.authenticate_user(username, data["password"])
+    except sqlite3.OperationalError as oe:
+        # Persistent database error
+        logger.error(f"Persistent database error during login: {str(oe)}")
+        return jsonify({
+            "error": "Login service temporarily unavailable. Please try again in a few moments.",
+            "success": False,
+            "retry_after": 5
+        }), 503  # Service Unavailable
+    except Exception as e:
+        # Return a system error
+        logger.error(f"Error during login: {str(e)}")
+        return jsonify({
+            "error": "Login failed due to a system error. Please try again later.",
+            "success": False
+        }), 500
     
     if user_id:
         try:
-            # Create session token with proper entropy
-            token = secrets.token_urlsafe(48)  # Increased from 32 to 48 for more security
-            user_manager.store_session_token(user_id, token)
+            # Signed token - verifiable by every worker without a lookup
+            token = user_manager.issue_session_token(user_id)
             
             # Ensure user profile exists
             try:
@@ -2405,6 +5391,43 @@ def login():
         }), 401
 
 # Knowledge base endpoint
+@app.route("/api/auth/logout", methods=["POST", "OPTIONS"])
+@login_required
+def logout():
+    """Revoke the bearer token used for this request"""
+    try:
+        revoked = user_manager.revoke_session_token(request.auth_token)
+    except Exception as e:
+        logger.error(f"Error revoking token for user {request.user_id}: {str(e)}")
+        return jsonify({"error": "Logout failed. Please try again.", "success": False}), 500
+    
+    if not revoked:
+        # Revocation disabled: the token stays valid until it expires
+        return jsonify({"message": "Token revocation is disabled on this server", "success": False}), 501
+    logger.info(f"Logout for user {request.user_id}")
+    return jsonify({"message": "Logged out", "success": True})
+
+@app.route("/api/admin/users/bulk", methods=["POST"])
+@admin_required
+def bulk_register():
+    """Provision many accounts in one batched transaction"""
+    data = request.get_json(silent=True)
+    users = data.get("users") if isinstance(data, dict) else None
+    if not isinstance(users, list) or not users:
+        return jsonify({"error": "Body must be {\"users\": [{\"username\", \"email\", \"password\"}, ...]}"}), 400
+    if len(users) > Config.BULK_MAX_USERS:
+        return jsonify({"error": f"At most {Config.BULK_MAX_USERS} users per request"}), 413
+    
+    started = time.time()
+    results = user_manager.bulk_create_users(users)
+    created = sum(1 for entry in results if entry["status"] == "created")
+    return jsonify({
+        "created": created,
+        "rejected": len(results) - created,
+        "seconds": round(time.time() - started, 3),
+        "results": results
+    })
+
 @app.route("/api/knowledge/add", methods=["POST"])
 @login_required
 def add_knowledge():
@@ -2455,7 +5478,9 @@ def status():
         status_data = {
             "status": "active",
             "model": Config.OLLAMA_MODEL,
-            "whisper_loaded": app_globals.audio_service.model is not None,
+            "whisper_loaded": app_globals._audio_service is not None and app_globals._audio_service.model is not None,
+            "models_ready": model_warmup.is_ready(),
+            "ollama": ollama_bootstrap.status(),
             "features": {
                 "mood_tracking": Config.ENABLE_MOOD_TRACKING,
                 "crisis_detection": Config.ENABLE_CRISIS_DETECTION,
@@ -2516,6 +5541,44 @@ def status():
     return response
 
 
+@app.route("/api/ready", methods=["GET"])
+def readiness():
+    """Readiness probe - 200 only once every model (the LLM included) is loaded and warmed"""
+    body = {
+        "ready": model_warmup.is_ready() and ollama_bootstrap.is_ready(),
+        "warmup": model_warmup.report(),
+        "ollama": ollama_bootstrap.status(),
+        "timestamp": datetime.now().isoformat()
+    }
+    return jsonify(body), 200 if body["ready"] else 503
+
+
+@app.route("/api/metrics", methods=["GET"])
+@admin_required
+def metrics():
+    """Internal performance counters - admin only, since they carry file paths and raw error text"""
+    return jsonify({
+        "db_pool": user_manager.db_pool.stats(),
+        "db_writer": user_manager.db_writer.stats(),
+        "db_maintenance": user_manager.db_maintenance.stats(),
+        "fallback_users": len(user_manager.fallback_users),
+        "pending_user_inserts": user_manager.pending_users.stats(),
+        "password_hasher": user_manager.password_hasher.stats(),
+        "user_profiles": app_globals.user_profiles.stats(),
+        "profile_writes": app_globals.profile_writer.stats(),
+        "profile_store": app_globals.profile_store.stats(),
+        "credential_cache": user_manager.credential_cache.stats(),
+        "retries": db_retry_policy.stats(),
+        "user_filter": {
+            **user_manager.user_filter.stats(),
+            **user_manager.availability_metrics,
+            "ready": user_manager.user_filter_ready
+        },
+        "revoked_tokens": user_manager.revoked_tokens.stats() if user_manager.revoked_tokens else None,
+        "timestamp": datetime.now().isoformat()
+    })
+
+
 @app.route("/api/chat", methods=["POST", "OPTIONS"])
 def enhanced_chat():
     """Main chat endpoint with multimodal support"""
@@ -2560,6 +5623,13 @@ def enhanced_chat():
     if not session_id:
         session_id = app_globals.session_manager.create_session(user_profile.user_id)
     
+    # Refuse new streams while the worker is shutting down
+    if not chat_stream_tracker.begin():
+        response = jsonify({"error": "Server is restarting, please retry", "retry_after": 2})
+        response.status_code = 503
+        response.headers["Retry-After"] = "2"
+        return response
+    
     def generate():
         try:
             # Analyze symptoms and crisis risk
@@ -2606,7 +5676,10 @@ def enhanced_chat():
             logger.error(f"Chat processing error: {e}")
             yield json.dumps({"error": str(e)}) + "\n"
     
-    return Response(stream_with_context(generate()), mimetype="application/json")
+    response = Response(stream_with_context(generate()), mimetype="application/json")
+    # Runs when the stream finishes or the client disconnects
+    response.call_on_close(chat_stream_tracker.end)
+    return response
 
 
 @app.route("/api/user/profile", methods=["GET", "POST", "OPTIONS"])
@@ -2767,7 +5840,11 @@ def track_mood():
         
         if mood_score is None:
             return jsonify({"error": "Mood score required"}), 400
-        
+        if isinstance(mood_score, bool) or not isinstance(mood_score, (int, float)) or not 1 <= mood_score <= 10:
+            return jsonify({"error": "Mood score must be a number from 1 to 10"}), 400
+        if not isinstance(emotions, list):
+            return jsonify({"error": "Emotions must be a list"}), 400
+
         user_profile = get_or_create_user_profile(user_id)
         user_profile.add_mood_entry(mood_score, emotions, data.get("notes", ""))
         trends = user_profile.get_mood_trends()
@@ -2796,6 +5873,28 @@ def track_mood():
         })
 
 
+@app.route("/api/mood/analytics", methods=["GET", "OPTIONS"])
+@login_required
+def mood_analytics():
+    """Mood averages, slopes, volatility and emotion frequencies for several windows"""
+    if request.method == "OPTIONS":
+        return make_response()
+    
+    try:
+        windows = [int(days) for days in request.args.get("windows", "7,30,90").split(",") if days.strip()]
+    except ValueError:
+        return jsonify({"error": "windows must be a comma-separated list of day counts"}), 400
+    if not windows or len(windows) > 10 or not all(1 <= days <= 3650 for days in windows):
+        return jsonify({"error": "windows must hold 1-10 day counts between 1 and 3650"}), 400
+    
+    try:
+        user_profile = get_or_create_user_profile(request.user_id)
+        return jsonify(user_profile.get_mood_analytics(windows))
+    except Exception as e:
+        logger.error(f"Error computing mood analytics: {str(e)}")
+        return jsonify({"error": "Mood analytics unavailable"}), 500
+
+
 @app.route("/api/resources/search", methods=["POST"])
 def search_resources():
     """Knowledge base search"""
@@ -3037,6 +6136,73 @@ def get_therapy_modules():
             return simple_response
 
 
+# ========================
+# SERVER LIFECYCLE
+# ========================
+def create_app(preload: bool = None) -> Flask:
+    """Application factory for WSGI servers (see wsgi.py / gunicorn.conf.py).
+
+    With `preload`, every model is loaded and warmed before the app is returned,
+    so when gunicorn preloads in the master, forked workers share the model
+    weights copy-on-write instead of each loading their own copy. Without it,
+    and with WARMUP_ON_FIRST_REQUEST, each serving process warms up in the
+    background (started by start_background_tasks or its first request);
+    /api/ready reports 503 until that finishes.
+    """
+    if preload is None:
+        preload = Config.PRELOAD_MODELS
+    if preload:
+        with app.app_context():
+            # The LLM lives in the Ollama process, so there is nothing to share:
+            # each worker warms it in the background, without holding up the fork
+            model_warmup.run([name for name in model_warmup.pending() if name != "ai_service"])
+        log_import_report()
+    return app
+
+
+def start_background_tasks():
+    """Start the per-process database maintenance schedulers and user write-behind.
+
+    Threads don't survive fork, so under gunicorn this runs in each worker
+    (post_fork), never in the preloading master that serves no requests.
+    Models are only warmed here when they were preloaded (what is left is the
+    LLM warm-up) or WARMUP_ON_FIRST_REQUEST asks for it.
+    """
+    if Config.PRELOAD_MODELS or Config.WARMUP_ON_FIRST_REQUEST:
+        model_warmup.start()
+    user_manager.db_maintenance.start()
+    user_manager.pending_users.start()
+    profile_maintenance = getattr(app_globals.profile_store, "maintenance", None)
+    if profile_maintenance is not None:
+        profile_maintenance.start()
+
+
+def shutdown_app(drain_timeout: float = 30.0):
+    """Persist pending writes, wait for in-flight chat streams and release resources.
+
+    Writes are flushed before waiting: under gunicorn this runs from
+    worker_exit, after the worker already waited for its requests, and the
+    master may SIGKILL it at any moment. The wait only uses what is left of
+    `drain_timeout` since draining started.
+    """
+    ollama_bootstrap.stop()
+    # From here on profile changes are written synchronously
+    app_globals.profile_writer.stop()
+    try:
+        user_manager.pending_users.flush()
+    except Exception as e:
+        logger.warning(f"Pending user inserts kept on disk for next start: {e}")
+    logger.info(f"🛑 Shutting down - draining {chat_stream_tracker.in_flight} in-flight chat stream(s)...")
+    if chat_stream_tracker.drain(drain_timeout):
+        logger.info("✅ All chat streams drained")
+    else:
+        logger.warning(f"⚠️ {chat_stream_tracker.in_flight} chat stream(s) still running after {drain_timeout:.0f}s")
+    app_globals.profile_store.close()
+    user_manager.db_maintenance.stop()
+    user_manager.db_writer.stop()
+    user_manager.db_pool.close_all()
+
+
 # ========================
 # UPDATED SYSTEM STARTUP SECTION WITH CLOUDFLARED
 # ========================
@@ -3102,20 +6268,19 @@ if __name__ == "__main__":
     with app.app_context():
         logger.info("🚀 Initializing services...")
         
-        # Initialize AI service first
+        # Load and warm every model in parallel, in the background so the
+        # server binds right away; /api/ready reports when it is done
+        model_warmup.start()
         ai_service = app_globals.ai_service
         
         # Log service status
         logger.info(f"Ollama status: {'Available' if ai_service.ollama_available else 'Unavailable'}")
         logger.info(f"Model status: {'Available' if ai_service.model_available else 'Unavailable'}")
         
-        # Initialize other services
-        _ = app_globals.psych_service
-        _ = app_globals.session_manager
-        _ = app_globals.audio_service
-        
         logger.info("✅ All services initialized")
-    
+        log_import_report()
+    start_background_tasks()
+
     # System status
     logger.info("=" * 60)
     logger.info("🧠 MindMate Psychological Support System")
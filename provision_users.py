@@ -0,0 +1,87 @@
+"""
+Offline bulk user provisioning
+
+Usage:
+    python provision_users.py accounts.csv [--db users.db] [--report report.csv]
+                              [--batch-size 1000] [--generate-passwords]
+
+The input is a CSV with a header row containing username, email and
+password columns (or a .json file holding a list of such objects). Rows are
+created through UserManager.bulk_create_users, one transaction per batch,
+and a per-row status report is written as CSV (stdout by default).
+With --generate-passwords, rows with an empty password get a random one,
+which is included in the report so it can be handed to the user.
+"""
+import os
+import sys
+import csv
+import json
+import time
+import secrets
+import argparse
+
+# Provisioning never needs the LLM server
+os.environ.setdefault("OLLAMA_MANAGE_SERVER", "False")
+os.environ.setdefault("OLLAMA_READY_TIMEOUT", "0")
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import logging
+import notebook4
+
+
+def load_users(path: str) -> list:
+    if path.endswith(".json"):
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        return list(csv.DictReader(f))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("input", help="CSV or JSON file of accounts")
+    parser.add_argument("--db", default="users.db", help="user database (default: users.db)")
+    parser.add_argument("--report", help="write the status report here instead of stdout")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--generate-passwords", action="store_true",
+                        help="create a random password for rows that have none")
+    args = parser.parse_args()
+
+    logging.getLogger("MindMateAPI").setLevel(logging.WARNING)
+    users = load_users(args.input)
+    generated = {}
+    if args.generate_passwords:
+        for row, user in enumerate(users):
+            if not user.get("password"):
+                user["password"] = generated[row] = secrets.token_urlsafe(12)
+
+    manager = notebook4.UserManager(db_path=args.db)
+    started = time.time()
+    results = []
+    for start in range(0, len(users), args.batch_size):
+        batch = manager.bulk_create_users(users[start:start + args.batch_size])
+        for entry in batch:
+            entry["row"] += start
+        results.extend(batch)
+
+    fields = ["row", "username", "email", "status", "user_id", "error"] + (["password"] if generated else [])
+    out = open(args.report, "w", encoding="utf-8", newline="") if args.report else sys.stdout
+    try:
+        writer = csv.DictWriter(out, fieldnames=fields, extrasaction="ignore")
+        writer.writeheader()
+        for entry in results:
+            if entry["status"] == "created" and entry["row"] in generated:
+                entry["password"] = generated[entry["row"]]
+            writer.writerow(entry)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+    created = sum(1 for entry in results if entry["status"] == "created")
+    print(f"{created} created, {len(results) - created} rejected in {time.time() - started:.1f}s",
+          file=sys.stderr)
+    return 0 if created == len(results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
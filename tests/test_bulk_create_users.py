@@ -0,0 +1,26 @@
+import sqlite3
+
+import notebook4
+from notebook4 import Config, UserManager, retry_deadline
+
+
+def test_bulk_create_outlasting_request_deadline(tmp_path, monkeypatch):
+    """Hashing the batch takes longer than the request deadline; the insert must still commit"""
+    monkeypatch.setattr(Config, "REQUEST_DEADLINE_SECONDS", 0.2)
+    db_path = str(tmp_path / "users.db")
+    manager = UserManager(db_path)
+    manager.password_hasher.max_workers = 1
+    users = [{"username": f"bulk{i}", "password": "secret123", "email": f"bulk{i}@example.com"}
+             for i in range(30)]
+
+    with retry_deadline(Config.REQUEST_DEADLINE_SECONDS):
+        report = manager.bulk_create_users(users)
+
+    assert [entry["status"] for entry in report] == ["created"] * len(users)
+    conn = sqlite3.connect(db_path)
+    try:
+        assert conn.execute("SELECT COUNT(*) FROM users WHERE username LIKE 'bulk%'").fetchone()[0] == len(users)
+    finally:
+        conn.close()
+    manager.db_maintenance.stop()
+    manager.db_writer.stop()
@@ -0,0 +1,67 @@
+import json
+import os
+
+import numpy as np
+
+from notebook4 import EmbeddingCache
+
+
+def encode(texts):
+    return np.array([[float(len(text)), float(sum(map(ord, text)))] for text in texts])
+
+
+def matrix_files(cache_dir):
+    return sorted(name for name in os.listdir(cache_dir) if name.endswith(".npy"))
+
+
+def manifest(cache_dir):
+    with open(os.path.join(cache_dir, "model.json"), encoding="utf-8") as f:
+        return json.load(f)
+
+
+def test_add_writes_only_the_new_rows(tmp_path):
+    cache = EmbeddingCache(str(tmp_path), "model")
+    cache.get_many(["a", "bb", "ccc"], encode)
+    first = manifest(tmp_path)["segments"][0]
+    first_stat = os.stat(tmp_path / first)
+
+    vectors = cache.get_many(["dddd", "a"], encode)
+
+    segments = manifest(tmp_path)["segments"]
+    assert segments[0] == first and len(segments) == 2
+    assert os.stat(tmp_path / first).st_mtime_ns == first_stat.st_mtime_ns
+    assert np.load(tmp_path / segments[1]).shape == (1, 2)
+    np.testing.assert_array_equal(vectors, encode(["dddd", "a"]))
+    assert matrix_files(tmp_path) == sorted(segments)
+
+
+def test_workers_sharing_a_directory_keep_each_others_rows(tmp_path):
+    worker_a = EmbeddingCache(str(tmp_path), "model")
+    worker_b = EmbeddingCache(str(tmp_path), "model")
+    worker_a.get_many(["from a"], encode)
+    worker_b.get_many(["from b"], encode)
+    worker_a.get_many(["from a again"], encode)
+
+    reloaded = EmbeddingCache(str(tmp_path), "model")
+    texts = ["from a", "from b", "from a again"]
+    np.testing.assert_array_equal(reloaded.get_many(texts, encode), encode(texts))
+    assert reloaded.misses == 0
+    assert matrix_files(tmp_path) == sorted(manifest(tmp_path)["segments"])
+
+
+def test_segments_are_merged_and_stale_files_removed(tmp_path, monkeypatch):
+    monkeypatch.setattr(EmbeddingCache, "MAX_SEGMENTS", 2)
+    # Left behind by a crashed write and by the old single-matrix layout
+    np.save(tmp_path / "model.abcd1234.npy", np.zeros((1, 2)))
+    np.save(tmp_path / "model.npy", np.zeros((1, 2)))
+    cache = EmbeddingCache(str(tmp_path), "model")
+    assert matrix_files(tmp_path) == []
+
+    for text in ["one", "two", "three"]:
+        cache.get_many([text], encode)
+
+    segments = manifest(tmp_path)["segments"]
+    assert len(segments) == 1
+    assert matrix_files(tmp_path) == segments
+    texts = ["one", "two", "three"]
+    np.testing.assert_array_equal(EmbeddingCache(str(tmp_path), "model").get_many(texts, encode), encode(texts))
@@ -0,0 +1,17 @@
+import notebook4
+from notebook4 import Config
+
+
+def test_metrics_requires_admin_key(monkeypatch):
+    """Counters include queue paths and raw errors, so only admins may read them"""
+    client = notebook4.app.test_client()
+
+    monkeypatch.setattr(Config, "ADMIN_API_KEY", "")
+    assert client.get("/api/metrics").status_code == 404
+
+    monkeypatch.setattr(Config, "ADMIN_API_KEY", "metrics-key")
+    assert client.get("/api/metrics").status_code == 403
+    assert client.get("/api/metrics", headers={"X-Admin-Key": "wrong"}).status_code == 403
+    response = client.get("/api/metrics", headers={"X-Admin-Key": "metrics-key"})
+    assert response.status_code == 200
+    assert "db_writer" in response.get_json()
@@ -0,0 +1,11 @@
+"""
+MindMate production WSGI entry point
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+With `preload_app` enabled the models are loaded once in the gunicorn master
+and shared copy-on-write by every forked worker.
+"""
+from notebook4 import create_app
+
+app = create_app()